@@ -1,18 +1,30 @@
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import date
 from enum import Enum, auto
+from pathlib import Path
 from typing import Any, Type, cast
+from uuid import uuid4
 
 import pandas as pd
 import streamlit as st
 
 from polish_pit_calculator.coinbase import CoinbaseTaxReporter
 from polish_pit_calculator.config import TaxReport, TaxReporter
+from polish_pit_calculator.detect import (
+    detect_tax_reporter,
+    group_by_tax_reporter,
+)
 from polish_pit_calculator.ib import IBTradeCashTaxReporter
 from polish_pit_calculator.manual import ManualTaxReporter
 from polish_pit_calculator.raw import RawTaxReporter
 from polish_pit_calculator.revolut import RevolutInterestTaxReporter
 from polish_pit_calculator.schwab import SchwabEmployeeSponsoredTaxReporter
+from polish_pit_calculator.store import TaxStore
+from polish_pit_calculator.uploads import StoredFile, UploadStore
+
+MAX_WORKERS = 4
+STORE_PATH = Path.home() / ".polish_pit_calculator.sqlite"
 
 
 class TaxReportType(Enum):
@@ -23,6 +35,7 @@ class TaxReportType(Enum):
 
 class TaxReportEnum(Enum):
     SELECT_TAX_REPORT = "— Select Tax Report —"
+    AUTO_DETECT = "Auto-detect (Files)"
     SCHWAB_EMPLOYEE_SPONSORED = "Charles Schwab (Employee Sponsored)"
     IB_TRADE_CASH = "Interactive Brokers (Trade Cash)"
     COINBASE_CRYPTO = "Coinbase (Crypto)"
@@ -34,6 +47,8 @@ class TaxReportEnum(Enum):
         match self:
             case TaxReportEnum.SELECT_TAX_REPORT:
                 return TaxReportType.PLACEHOLDER
+            case TaxReportEnum.AUTO_DETECT:
+                return TaxReportType.FILES
             case TaxReportEnum.SCHWAB_EMPLOYEE_SPONSORED:
                 return TaxReportType.FILES
             case TaxReportEnum.IB_TRADE_CASH:
@@ -55,6 +70,10 @@ class TaxReportEnum(Enum):
                 raise ValueError(
                     "Cannot get TaxReporter class for PLACEHOLDER"
                 )
+            case TaxReportEnum.AUTO_DETECT:
+                raise ValueError(
+                    "Cannot get TaxReporter class for AUTO_DETECT"
+                )
             case TaxReportEnum.SCHWAB_EMPLOYEE_SPONSORED:
                 return SchwabEmployeeSponsoredTaxReporter
             case TaxReportEnum.IB_TRADE_CASH:
@@ -70,6 +89,17 @@ class TaxReportEnum(Enum):
             case _ as unknown:
                 raise ValueError(f"Unknown TaxReportEnum: {unknown}")
 
+    @classmethod
+    def from_cls(cls, tax_reporter_cls: Type[TaxReporter]) -> "TaxReportEnum":
+        for tax_report_enum in cls:
+            if (
+                tax_report_enum.to_type().value == TaxReportType.FILES.value
+                and tax_report_enum.value != cls.AUTO_DETECT.value
+                and tax_report_enum.to_cls() is tax_reporter_cls
+            ):
+                return tax_report_enum
+        raise ValueError(f"Unknown TaxReporter class: {tax_reporter_cls}")
+
 
 @dataclass
 class TaxReportEntry:
@@ -77,12 +107,55 @@ class TaxReportEntry:
     tax_report_data: Any
 
 
+@dataclass
+class TaxReportSummary:
+    names: list[str]
+    tax_reporters: list[TaxReporter]
+    futures: list[Future[TaxReport]]
+    cancelled: bool = False
+
+    @property
+    def finished(self) -> bool:
+        return self.cancelled or all(future.done() for future in self.futures)
+
+
+@st.cache_resource
+def get_tax_store() -> TaxStore:
+    return TaxStore(STORE_PATH)
+
+
+@st.cache_resource
+def get_upload_store() -> UploadStore:
+    return UploadStore()
+
+
 def initialize_state() -> None:
     st.session_state.session_index = st.session_state.get("session_index", 0)
     st.session_state.tax_report_entries = st.session_state.get(
         "tax_report_entries", []
     )
     st.session_state.table = st.session_state.get("table", None)
+    st.session_state.summary = st.session_state.get("summary", None)
+    st.session_state.polling = st.session_state.get("polling", False)
+    st.session_state.taxpayer = st.session_state.get("taxpayer", "default")
+    st.session_state.upload_session = st.session_state.get(
+        "upload_session", uuid4().hex
+    )
+    uploaded = [
+        x
+        for x in st.session_state.tax_report_entries
+        if x.tax_report_enum.to_type().value == TaxReportType.FILES.value
+    ]
+    upload_store = get_upload_store()
+    if not upload_store.touch(
+        st.session_state.upload_session,
+        *[f for x in uploaded for f in x.tax_report_data],
+    ):
+        upload_store.release(st.session_state.upload_session)
+        st.session_state.tax_report_entries = [
+            x for x in st.session_state.tax_report_entries if x not in uploaded
+        ]
+        st.session_state.uploads_expired = True
 
 
 def setup_and_display_header() -> None:
@@ -120,19 +193,54 @@ def resolve_tax_report_enum() -> TaxReportEnum:
 
 
 def select_and_submit_files(tax_report_enum: TaxReportEnum) -> None:
-    files = st.file_uploader(
+    uploaded_files = st.file_uploader(
         "Reports (min. 1)",
         key=f"selected_tax_report_files_{st.session_state.session_index}",
         accept_multiple_files=True,
     )
-    if files:
+    if uploaded_files:
         st.markdown("</br>", unsafe_allow_html=True)
         if st.button("Submit"):
-            tax_report_entry = TaxReportEntry(
-                tax_report_enum=tax_report_enum,
-                tax_report_data=files,
-            )
-            st.session_state.tax_report_entries.append(tax_report_entry)
+            upload_store = get_upload_store()
+            upload_session = st.session_state.upload_session
+            try:
+                files = upload_store.put(upload_session, *uploaded_files)
+            except ValueError as e:
+                st.error(str(e))
+                return
+            if tax_report_enum.value == TaxReportEnum.AUTO_DETECT.value:
+                try:
+                    groups = group_by_tax_reporter(*files)
+                except ValueError as e:
+                    upload_store.release(upload_session, *files)
+                    st.error(str(e))
+                    return
+                tax_report_entries = [
+                    TaxReportEntry(
+                        tax_report_enum=TaxReportEnum.from_cls(x),
+                        tax_report_data=y,
+                    )
+                    for x, y in groups.items()
+                ]
+            else:
+                mismatched = [
+                    f"{f.name} looks like a "
+                    f"{TaxReportEnum.from_cls(x).value} report."
+                    for f in files
+                    if (x := detect_tax_reporter(f)) is not None
+                    and x is not tax_report_enum.to_cls()
+                ]
+                if mismatched:
+                    upload_store.release(upload_session, *files)
+                    st.error(" ".join(mismatched))
+                    return
+                tax_report_entries = [
+                    TaxReportEntry(
+                        tax_report_enum=tax_report_enum,
+                        tax_report_data=files,
+                    )
+                ]
+            st.session_state.tax_report_entries.extend(tax_report_entries)
             st.session_state.session_index += 1
             st.rerun()
 
@@ -299,35 +407,192 @@ def display_tax_report_entries() -> None:
         with dg3:
             if st.button("Delete", key=i):
                 st.session_state.tax_report_entries.pop(i)
+                if (
+                    tax_report_entry.tax_report_enum.to_type().value
+                    == TaxReportType.FILES.value
+                ):
+                    get_upload_store().release(
+                        st.session_state.upload_session,
+                        *tax_report_entry.tax_report_data,
+                    )
                 st.rerun()
 
 
+def create_tax_reporter(
+    tax_report_entry: TaxReportEntry, **kwargs: Any
+) -> TaxReporter:
+    tax_reporter_cls = tax_report_entry.tax_report_enum.to_cls()
+    match tax_report_entry.tax_report_enum.to_type().value:
+        case TaxReportType.FILES.value:
+            return tax_reporter_cls(
+                *tax_report_entry.tax_report_data, **kwargs
+            )
+        case TaxReportType.MANUAL.value:
+            return tax_reporter_cls(tax_report_entry.tax_report_data)
+        case _ as unknown:
+            raise ValueError(f"Unknown TaxReportType value: {unknown}")
+
+
+def generate_and_save(
+    tax_reporter: TaxReporter,
+    tax_store: TaxStore,
+    taxpayer: str,
+    file_hash: str,
+    names: list[str],
+) -> TaxReport:
+    tax_report = tax_reporter.generate()
+    tax_store.save(taxpayer, file_hash, tax_reporter, tax_report, names)
+    return tax_report
+
+
+def submit_tax_report(
+    executor: ThreadPoolExecutor, tax_report_entry: TaxReportEntry
+) -> tuple[TaxReporter, Future[TaxReport]]:
+    tax_report_type = tax_report_entry.tax_report_enum.to_type()
+    tax_reporter = create_tax_reporter(tax_report_entry)
+    files: list[StoredFile] = []
+    match tax_report_type.value:
+        case TaxReportType.FILES.value:
+            files = tax_report_entry.tax_report_data
+            names = [f.name for f in files]
+        case TaxReportType.MANUAL.value:
+            names = [f"Year {tax_report_entry.tax_report_data['year']}"]
+        case _ as unknown:
+            raise ValueError(f"Unknown TaxReportType value: {unknown}")
+    tax_store = get_tax_store()
+    taxpayer = st.session_state.taxpayer
+    file_hash = TaxStore.report_hash(tax_reporter, *files)
+    future: Future[TaxReport]
+    if (tax_report := tax_store.load_tax_report(taxpayer, file_hash)) is None:
+        upload_store = get_upload_store()
+        if files:
+            tax_reporter.audit_path = tax_store.lot_writer(taxpayer, file_hash)
+            upload_store.pin(*files)
+        future = executor.submit(
+            generate_and_save,
+            tax_reporter,
+            tax_store,
+            taxpayer,
+            file_hash,
+            names,
+        )
+        future.add_done_callback(lambda _: upload_store.unpin(*files))
+    else:
+        future = Future()
+        future.set_result(tax_report)
+    return tax_reporter, future
+
+
 def summarize_tax_reports() -> None:
-    tax_report = TaxReport()
-    for tax_report_entry in st.session_state.tax_report_entries:
-        tax_report_entry = cast(TaxReportEntry, tax_report_entry)
-        tax_reporter_cls = tax_report_entry.tax_report_enum.to_cls()
-        match tax_report_entry.tax_report_enum.to_type().value:
-            case TaxReportType.FILES.value:
-                for f in tax_report_entry.tax_report_data:
-                    f.seek(0)
-                tax_reporter = tax_reporter_cls(
-                    *tax_report_entry.tax_report_data
+    cancel_summary()
+    entries = cast(list[TaxReportEntry], st.session_state.tax_report_entries)
+    executor = ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(entries)))
+    tax_reporters, futures = zip(
+        *[
+            submit_tax_report(executor, tax_report_entry)
+            for tax_report_entry in entries
+        ]
+    )
+    executor.shutdown(wait=False)
+    st.session_state.summary = TaxReportSummary(
+        names=[
+            f"#{i + 1} — {tax_report_entry.tax_report_enum.value}"
+            for i, tax_report_entry in enumerate(entries)
+        ],
+        tax_reporters=list(tax_reporters),
+        futures=list(futures),
+    )
+    st.session_state.table = None
+
+
+def display_saved_tax_reports() -> None:
+    with st.sidebar:
+        st.text_input("Taxpayer", key="taxpayer")
+        tax_store = get_tax_store()
+        files = tax_store.load_files(st.session_state.taxpayer)
+        if files.empty:
+            return
+        st.markdown("### Saved Tax Reports:")
+        files.index += 1
+        st.dataframe(files[["reporter", "names"]])
+        selected = st.multiselect(
+            "Combine",
+            options=files.index,
+            placeholder="Latest of each reporter per year",
+        )
+        if st.button("Summarize Saved"):
+            cancel_summary()
+            st.session_state.summary = None
+            tax_report = tax_store.load_tax_report(
+                st.session_state.taxpayer, *files.loc[selected, "file_hash"]
+            )
+            st.session_state.table = cast(TaxReport, tax_report).to_dataframe()
+
+
+def cancel_summary() -> None:
+    summary = cast(TaxReportSummary | None, st.session_state.summary)
+    if summary is not None and not summary.finished:
+        for future in summary.futures:
+            future.cancel()
+        summary.cancelled = True
+
+
+def display_summary() -> None:
+    summary = cast(TaxReportSummary | None, st.session_state.summary)
+    if st.session_state.polling and (summary is None or summary.finished):
+        st.rerun()
+    if summary is not None:
+        done = [
+            (name, tax_reporter, future)
+            for name, tax_reporter, future in zip(
+                summary.names, summary.tax_reporters, summary.futures
+            )
+            if future.done() and not future.cancelled()
+        ]
+        if summary.cancelled:
+            st.warning(
+                f"Summary cancelled after {len(done)} of "
+                f"{len(summary.futures)} tax reports."
+            )
+        elif not summary.finished:
+            c1, c2 = st.columns([0.9, 0.1])
+            with c1:
+                st.progress(
+                    len(done) / len(summary.futures),
+                    text=f"Summarized {len(done)} of "
+                    f"{len(summary.futures)} tax reports...",
                 )
-            case TaxReportType.MANUAL.value:
-                tax_reporter = tax_reporter_cls(
-                    tax_report_entry.tax_report_data
+            with c2:
+                if st.button("Cancel"):
+                    cancel_summary()
+                    st.rerun(scope="fragment")
+        tax_report = TaxReport()
+        for name, tax_reporter, future in done:
+            if (exc := future.exception()) is not None:
+                st.error(f"{name}: {exc}")
+                continue
+            tax_report += future.result()
+            if duplicates := sum(tax_reporter.duplicate_rows_.values()):
+                st.info(
+                    f"{name}: skipped {duplicates} rows repeated in "
+                    "overlapping files."
                 )
-            case _ as unknown:
-                raise ValueError(f"Unknown TaxReportType value: {unknown}")
-        tax_report += tax_reporter.generate()
-    df = tax_report.to_dataframe()
-    st.session_state.table = df
+        if tax_report.year_to_tax_record:
+            st.session_state.table = tax_report.to_dataframe()
+    if st.session_state.table is not None:
+        st.markdown("</br>", unsafe_allow_html=True)
+        st.dataframe(st.session_state.table)
 
 
 def main() -> None:
     initialize_state()
     setup_and_display_header()
+    if st.session_state.pop("uploads_expired", False):
+        st.warning(
+            "Uploaded files expired and their reports were removed. "
+            "Please upload them again."
+        )
+    display_saved_tax_reports()
     tax_report_enum = resolve_tax_report_enum()
     match tax_report_enum.to_type():
         case TaxReportType.PLACEHOLDER:
@@ -345,9 +610,11 @@ def main() -> None:
         st.markdown("</br>", unsafe_allow_html=True)
         if st.button("Summarize"):
             summarize_tax_reports()
-    if st.session_state.table is not None:
-        st.markdown("</br>", unsafe_allow_html=True)
-        st.dataframe(st.session_state.table)
+    summary = cast(TaxReportSummary | None, st.session_state.summary)
+    st.session_state.polling = summary is not None and not summary.finished
+    st.fragment(
+        display_summary, run_every=0.5 if st.session_state.polling else None
+    )()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,147 @@
+import argparse
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+from polish_pit_calculator.utils import parse_exchange_rates_archive
+
+CURRENCIES = [
+    "1THB",
+    "1USD",
+    "1AUD",
+    "1HKD",
+    "1CAD",
+    "1NZD",
+    "1SGD",
+    "1EUR",
+    "100HUF",
+    "1CHF",
+    "1GBP",
+    "1UAH",
+    "100JPY",
+    "1CZK",
+    "1DKK",
+    "100ISK",
+    "1NOK",
+    "1SEK",
+    "1RON",
+    "1BGN",
+    "1TRY",
+    "1ILS",
+    "100CLP",
+    "1PHP",
+    "1MXN",
+    "1ZAR",
+    "1BRL",
+    "1MYR",
+    "10000IDR",
+    "100INR",
+    "100KRW",
+    "1CNY",
+    "1XDR",
+]
+
+
+def write_archive(path: Path, year: int, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    lines = [
+        ";".join(["data", *CURRENCIES, "nr tabeli", "pełny numer tabeli"])
+        + ";",
+        ";".join(["", *(f"waluta {x}" for x in CURRENCIES), "", ""]) + ";",
+    ]
+    day = date(year, 1, 1)
+    number = 0
+    while day.year == year:
+        if day.weekday() < 5:
+            number += 1
+            rates = [f"{rng.uniform(0.1, 5.0):.4f}" for _ in CURRENCIES]
+            lines.append(
+                ";".join(
+                    [
+                        f"{day:%Y%m%d}",
+                        *(x.replace(".", ",") for x in rates),
+                        str(number),
+                        f"{number:03d}/A/NBP/{year}",
+                    ]
+                )
+                + ";"
+            )
+        day += timedelta(days=1)
+    lines.append(";".join(["kod ISO", *(x[-3:] for x in CURRENCIES)]) + ";")
+    lines.append(
+        ";".join(["nazwa waluty", *(f"waluta {x}" for x in CURRENCIES)]) + ";"
+    )
+    lines.append(
+        ";".join(["liczba jednostek", *(x[:-3] for x in CURRENCIES)]) + ";"
+    )
+    path.write_text("\n".join(lines) + "\n", encoding="iso-8859-2")
+
+
+def _try_to_cast_string_to_float(x) -> float | None:
+    try:
+        assert "," in x
+        return float(x.replace(",", "."))
+    except (AttributeError, ValueError, AssertionError, TypeError):
+        return None
+
+
+def parse_exchange_rates_archive_per_cell(source: Path) -> pd.DataFrame:
+    df = (
+        pd.read_csv(
+            source,
+            delimiter=";",
+            encoding="iso-8859-2",
+            header=0,
+            skiprows=[1],
+        )
+        .set_index("data")
+        .map(_try_to_cast_string_to_float)
+        .dropna(axis=1, how="all")
+        .dropna(axis=0, how="all")
+        .astype(float)
+        .rename_axis(index="Date")
+    )
+    df.index = pd.to_datetime(df.index).date
+    df.columns = [f"_{x}" if x[0].isdigit() else x for x in df.columns]
+    return df
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(f"{'parser':>10} {'ms/year':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [
+            Path(tmp) / f"archiwum_tab_a_{x}.csv" for x in range(args.years)
+        ]
+        for year, path in enumerate(paths, start=2015):
+            write_archive(path, year, seed=year)
+        for path in paths:
+            pd.testing.assert_frame_equal(
+                parse_exchange_rates_archive(path.read_bytes()),
+                parse_exchange_rates_archive_per_cell(path),
+            )
+        for name, parse in [
+            ("per-cell", parse_exchange_rates_archive_per_cell),
+            (
+                "vectorized",
+                lambda x: parse_exchange_rates_archive(x.read_bytes()),
+            ),
+        ]:
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                for path in paths:
+                    parse(path)
+                times.append(time.perf_counter() - start)
+            print(f"{name:>10} {1e3 * min(times) / len(paths):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
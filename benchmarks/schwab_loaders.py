@@ -0,0 +1,176 @@
+import argparse
+import csv
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any
+
+from polish_pit_calculator.schwab import SchwabEmployeeSponsoredTaxReporter
+
+MAIN_COLUMNS = [
+    "Date",
+    "Action",
+    "Symbol",
+    "Quantity",
+    "Description",
+    "FeesAndCommissions",
+    "DisbursementElection",
+    "Amount",
+]
+DETAIL_COLUMNS = [
+    "Type",
+    "Shares",
+    "SalePrice",
+    "SubscriptionDate",
+    "SubscriptionFairMarketValue",
+    "PurchaseDate",
+    "PurchasePrice",
+    "PurchaseFairMarketValue",
+    "DispositionType",
+    "GrantId",
+    "VestDate",
+    "VestFairMarketValue",
+    "GrossProceeds",
+    "AwardDate",
+    "AwardId",
+    "FairMarketValuePrice",
+    "SharesSoldWithheldForTaxes",
+    "NetSharesDeposited",
+    "Taxes",
+]
+
+
+def generate_transactions(n: int, seed: int = 0) -> list[dict[str, Any]]:
+    rng = random.Random(seed)
+    day = date(2015, 1, 1)
+    transactions: list[dict[str, Any]] = []
+    for _ in range(n):
+        day += timedelta(days=rng.randint(0, 2))
+        quantity = rng.randint(1, 50)
+        price = f"${rng.uniform(50, 200):,.4f}"
+        draw = rng.random()
+        if draw < 0.5:
+            main = {"Action": "Deposit", "Description": "RS"}
+            details = [
+                {
+                    "PurchaseDate": f"{day:%m/%d/%Y}",
+                    "PurchasePrice": price,
+                    "VestFairMarketValue": price,
+                }
+            ]
+        elif draw < 0.6:
+            main = {"Action": "Lapse", "Description": "Restricted Stock Lapse"}
+            details = [
+                {
+                    "AwardDate": f"{day:%m/%d/%Y}",
+                    "FairMarketValuePrice": price,
+                    "NetSharesDeposited": str(quantity),
+                }
+            ]
+        elif draw < 0.85:
+            main = {
+                "Action": "Sale",
+                "Description": "Share Sale",
+                "FeesAndCommissions": "$0.10",
+            }
+            details = [
+                {"Type": "RS", "Shares": str(quantity), "SalePrice": price}
+            ]
+        else:
+            dividend = rng.uniform(1, 100)
+            main = {
+                "Action": "Dividend",
+                "Description": "Credit",
+                "Amount": f"${dividend:,.2f}",
+            }
+            details = []
+            transactions.append(
+                {
+                    "Date": f"{day:%m/%d/%Y}",
+                    "Action": "Tax Withholding",
+                    "Symbol": "XYZ",
+                    "Description": "Debit",
+                    "Amount": f"-${0.15 * dividend:,.2f}",
+                    "TransactionDetails": [],
+                }
+            )
+        transactions.append(
+            {
+                "Date": f"{day:%m/%d/%Y}",
+                "Symbol": "XYZ",
+                "Quantity": str(quantity),
+                **main,
+                "TransactionDetails": [{"Details": x} for x in details],
+            }
+        )
+    return transactions[::-1]
+
+
+def write_csv(path: Path, transactions: list[dict[str, Any]]) -> None:
+    with path.open("w", newline="") as f:
+        writer = csv.DictWriter(f, MAIN_COLUMNS + DETAIL_COLUMNS)
+        writer.writeheader()
+        for transaction in transactions:
+            writer.writerow({k: transaction.get(k, "") for k in MAIN_COLUMNS})
+            for detail in transaction["TransactionDetails"]:
+                writer.writerow(detail["Details"])
+
+
+def write_json(path: Path, transactions: list[dict[str, Any]]) -> None:
+    with path.open("w") as f:
+        json.dump({"Transactions": transactions}, f, indent=2)
+
+
+def benchmark(
+    path: Path, repeat: int, low_memory: bool
+) -> tuple[float, float]:
+    tax_reporter = SchwabEmployeeSponsoredTaxReporter(
+        path, low_memory=low_memory
+    )
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tax_reporter._load_report()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    tax_reporter._load_report()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak / 2**20
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(
+        f"{'transactions':>12} {'format':>6} {'mode':>10} {'MB':>7} "
+        f"{'s':>7} {'peak MB':>8}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            transactions = generate_transactions(n)
+            for suffix, write in [("csv", write_csv), ("json", write_json)]:
+                path = Path(tmp) / f"export_{n}.{suffix}"
+                write(path, transactions)
+                size = path.stat().st_size / 2**20
+                for mode, low_memory in [
+                    ("default", False),
+                    ("low-memory", True),
+                ]:
+                    seconds, peak = benchmark(path, args.repeat, low_memory)
+                    print(
+                        f"{n:>12} {suffix:>6} {mode:>10} {size:>7.1f} "
+                        f"{seconds:>7.2f} {peak:>8.1f}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+from abc import ABC, abstractmethod
+from pathlib import Path
+from types import TracebackType
+from typing import Any
+
+import pandas as pd
+
+AUDIT_COLUMNS = {
+    "Symbol": "string",
+    "Currency": "string",
+    "BuyDate": "datetime64[s]",
+    "SellDate": "datetime64[s]",
+    "Quantity": "float64",
+    "BuyAmount": "float64",
+    "SellAmount": "float64",
+    "BuyExchangeRateDate": "datetime64[s]",
+    "BuyExchangeRate": "float64",
+    "SellExchangeRateDate": "datetime64[s]",
+    "SellExchangeRate": "float64",
+    "BuyAmountPLN": "float64",
+    "SellAmountPLN": "float64",
+}
+
+
+class LotWriter(ABC):
+    def __init__(self, batch_size: int = 10_000) -> None:
+        self.batch_size = batch_size
+        self._batches: list[pd.DataFrame] = []
+        self._size = 0
+        self._written = False
+
+    def write(self, lots: pd.DataFrame) -> None:
+        self._batches.append(lots[list(AUDIT_COLUMNS)].astype(AUDIT_COLUMNS))
+        self._size += len(lots)
+        if self._size >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._batches:
+            return
+        df = pd.concat(self._batches, ignore_index=True)
+        self._batches = []
+        self._size = 0
+        self._write_batch(df)
+        self._written = True
+
+    def close(self) -> None:
+        if not self._written and not self._batches:
+            self.write(pd.DataFrame(columns=list(AUDIT_COLUMNS)))
+        self.flush()
+
+    def __enter__(self) -> "LotWriter":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    @abstractmethod
+    def _write_batch(self, df: pd.DataFrame) -> None:
+        pass
+
+
+class LotAuditWriter(LotWriter):
+    def __init__(self, path: str | Path, batch_size: int = 10_000) -> None:
+        super().__init__(batch_size)
+        self.path = Path(path)
+        if self.path.suffix not in {".csv", ".parquet"}:
+            raise ValueError(f"Unsupported audit file type: {self.path}")
+        self._parquet_writer: Any = None
+
+    def close(self) -> None:
+        super().close()
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+    def _write_batch(self, df: pd.DataFrame) -> None:
+        if self.path.suffix == ".parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(
+                    self.path, table.schema
+                )
+            self._parquet_writer.write_table(table)
+        else:
+            df.to_csv(
+                self.path,
+                mode="a" if self._written else "w",
+                header=not self._written,
+                index=False,
+            )
@@ -1,54 +1,57 @@
+import numpy as np
 import pandas as pd
 
-from polish_pit_calculator.config import TaxRecord, TaxReport, TaxReporter
-from polish_pit_calculator.utils import fetch_exchange_rates, get_exchange_rate
+from polish_pit_calculator.ledger import LedgerTaxReporter
 
+COLUMNS = {
+    "ID": "str",
+    "Timestamp": "str",
+    "Transaction Type": "str",
+    "Asset": "str",
+    "Quantity Transacted": "float64",
+    "Price Currency": "str",
+    "Subtotal": "str",
+    "Fees and/or Spread": "str",
+}
 
-class CoinbaseTaxReporter(TaxReporter):
-    def generate(self) -> TaxReport:
+CATEGORIES = ["Transaction Type", "Asset", "Price Currency"]
+
+
+class CoinbaseTaxReporter(LedgerTaxReporter):
+    symbol_columns = ["Asset"]
+
+    def _load_ledger(self) -> pd.DataFrame:
         df = self._load_report()
-        tax_report = TaxReport()
-        for year, df_year in df.groupby("Year"):
-            tax_report[year] = TaxRecord(
-                crypto_revenue=df_year["Income"].sum(),
-                crypto_cost=df_year["Cost"].sum(),
-            )
-        return tax_report
+        self.transactions_["Transactions"] = df
+        return pd.DataFrame(
+            {
+                "Date": df["Timestamp"].dt.tz_localize(None),
+                "Kind": np.where(
+                    df["Transaction Type"] == "Advanced Trade Buy",
+                    "CryptoBuy",
+                    "CryptoSell",
+                ),
+                "Symbol": df["Asset"],
+                "Quantity": df["Quantity Transacted"],
+                "Amount": df["Subtotal"],
+                "Currency": df["Price Currency"],
+                "Fees": df["Fees and/or Spread"],
+            }
+        )
 
     def _load_report(self) -> pd.DataFrame:
-        reports = []
-        for arg in self.args:
-            report = pd.read_csv(arg, skiprows=3, parse_dates=["Timestamp"])
-            reports.append(report)
-        df = pd.concat(reports, ignore_index=True)
-        df["Timestamp"] = df["Timestamp"].dt.date
-        df["Year"] = df["Timestamp"].apply(lambda x: x.year)
+        reports = self._map_args(
+            lambda x: self._read_csv(
+                x, COLUMNS, skiprows=3, parse_dates=["Timestamp"]
+            )
+        )
+        df = self._concat_reports("Transactions", reports, ["ID"])
         df = df[
             df["Transaction Type"].isin(
                 ["Advanced Trade Buy", "Advanced Trade Sell"]
             )
-        ]
+        ].reset_index(drop=True)
+        df["Year"] = df["Timestamp"].dt.year
         for col in ["Subtotal", "Fees and/or Spread"]:
-            df[col] = df[col].str.extract(r"[^\d](.*)").astype(float)
-        df[["Cost", "Income"]] = 0.0
-        buy = df[df["Transaction Type"] == "Advanced Trade Buy"]
-        if not buy.empty:
-            buy["Cost"] += buy["Subtotal"]
-            buy["Cost"] += buy["Fees and/or Spread"]
-        sell = df[df["Transaction Type"] == "Advanced Trade Sell"]
-        if not sell.empty:
-            sell["Income"] += sell["Subtotal"]
-            sell["Cost"] += sell["Fees and/or Spread"]
-        df = pd.concat([buy, sell])
-        exchange_rates = fetch_exchange_rates(df["Year"].min())
-        exc_rate = df.apply(
-            lambda x: get_exchange_rate(
-                currency=x["Price Currency"],
-                date_=x["Timestamp"],
-                exchange_rates=exchange_rates,
-            ),
-            axis=1,
-        )
-        df["Cost"] *= exc_rate
-        df["Income"] *= exc_rate
-        return df
+            df[col] = df[col].str.extract(r"[^\d](.*)")[0].astype(float)
+        return self._compact(df, CATEGORIES)
@@ -1,9 +1,26 @@
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from dataclasses import dataclass, field
-from typing import Any
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Iterator, TypeVar
 
+import numpy as np
 import pandas as pd
 
+from polish_pit_calculator.audit import LotAuditWriter, LotWriter
+from polish_pit_calculator.utils import (
+    MONEY_SCALE,
+    convert_minor_units,
+    find_duplicates,
+    fingerprint_blocks,
+    fingerprint_rows,
+    to_minor_units,
+    to_scaled_rates,
+)
+
+T = TypeVar("T")
+
 
 @dataclass(frozen=True)
 class TaxRecord:
@@ -157,6 +174,10 @@ class TaxRecord:
             "Total Tax": "",
         }
 
+    @classmethod
+    def from_minor_units(cls, **amounts: int) -> "TaxRecord":
+        return cls(**{k: v / MONEY_SCALE for k, v in amounts.items()})
+
     def __add__(self, other: "TaxRecord") -> "TaxRecord":
         kwargs = {
             field: getattr(self, field) + getattr(other, field)
@@ -210,9 +231,145 @@ class TaxReport:
 
 
 class TaxReporter(ABC):
-    def __init__(self, *args: Any) -> None:
+    chunk_size = 20_000
+    max_workers = 4
+    year_columns = ["Year"]
+    symbol_columns = ["Symbol"]
+
+    def __init__(
+        self,
+        *args: Any,
+        fixed_point: bool = False,
+        audit_path: str | Path | LotWriter | None = None,
+        low_memory: bool = False,
+    ) -> None:
         self.args = args
+        self.fixed_point = fixed_point
+        self.low_memory = low_memory
+        self.audit_path = audit_path
+        self.duplicate_rows_: dict[str, int] = {}
+        self.transactions_: dict[str, pd.DataFrame] = {}
+
+    @property
+    def options(self) -> dict[str, Any]:
+        return {"fixed_point": self.fixed_point, "low_memory": self.low_memory}
 
     @abstractmethod
-    def generate(self) -> TaxReport:
+    def generate_iter(self) -> Iterator[tuple[int, TaxRecord]]:
         pass
+
+    def generate(self) -> TaxReport:
+        tax_report = TaxReport()
+        for year, tax_record in self.generate_iter():
+            tax_report[year] = tax_record
+        return tax_report
+
+    def _to_pln(self, amount: Any, rate: Any) -> np.ndarray:
+        if self.fixed_point:
+            return convert_minor_units(
+                to_minor_units(amount), to_scaled_rates(rate)
+            )
+        return np.asarray(amount, dtype=float) * np.asarray(rate, dtype=float)
+
+    def _from_money(self, amount: Any) -> np.ndarray:
+        if self.fixed_point:
+            return np.asarray(amount, dtype=np.int64) / MONEY_SCALE
+        return np.asarray(amount, dtype=float)
+
+    def _audit_writer(self) -> ContextManager[LotWriter | None]:
+        if self.audit_path is None:
+            return nullcontext()
+        if isinstance(self.audit_path, LotWriter):
+            return self.audit_path
+        return LotAuditWriter(self.audit_path)
+
+    def _map_args(self, read: Callable[[Any], T]) -> list[T]:
+        if self.low_memory or self.max_workers < 2 or len(self.args) < 2:
+            return [read(x) for x in self.args]
+        with ThreadPoolExecutor(
+            max_workers=min(self.max_workers, len(self.args))
+        ) as executor:
+            return list(executor.map(read, self.args))
+
+    def _read_csv(
+        self, source: Any, dtypes: dict[str, str], **kwargs: Any
+    ) -> pd.DataFrame:
+        chunks = list(self._read_csv_chunks(source, dtypes, **kwargs))
+        if len(chunks) == 1:
+            return chunks[0]
+        return pd.concat(chunks, ignore_index=True)
+
+    def _read_csv_chunks(
+        self, source: Any, dtypes: dict[str, str], **kwargs: Any
+    ) -> Iterator[pd.DataFrame]:
+        if not self.low_memory:
+            yield pd.read_csv(source, **kwargs)
+            return
+        dates = kwargs.get("parse_dates", [])
+        with pd.read_csv(
+            source,
+            usecols=lambda x: x in dtypes,
+            dtype={k: v for k, v in dtypes.items() if k not in dates},
+            chunksize=self.chunk_size,
+            **kwargs,
+        ) as reader:
+            yield from reader
+
+    def _compact(
+        self, df: pd.DataFrame, categories: list[str]
+    ) -> pd.DataFrame:
+        if not self.low_memory:
+            return df
+        df = df.astype({x: "category" for x in categories if x in df})
+        for col in df.select_dtypes("integer"):
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+        return df
+
+    def _concat_reports(
+        self,
+        label: str,
+        reports: list[pd.DataFrame],
+        columns: list[str] | None = None,
+    ) -> pd.DataFrame:
+        df = pd.concat(reports, ignore_index=True)
+        sources = np.repeat(np.arange(len(reports)), [len(x) for x in reports])
+        return self._drop_duplicates(label, df, sources, columns)
+
+    def _drop_duplicates(
+        self,
+        label: str,
+        df: pd.DataFrame,
+        sources: np.ndarray,
+        columns: list[str] | None = None,
+        blocks: np.ndarray | None = None,
+    ) -> pd.DataFrame:
+        fingerprints = fingerprint_rows(df, columns)
+        if blocks is not None:
+            fingerprints = fingerprint_blocks(fingerprints, blocks)
+            starts = np.flatnonzero(np.diff(blocks, prepend=-1))
+            duplicated = np.repeat(
+                find_duplicates(fingerprints[starts], sources[starts]),
+                np.diff(starts, append=len(blocks)),
+            )
+        else:
+            duplicated = find_duplicates(fingerprints, sources)
+        self.duplicate_rows_[label] = int(duplicated.sum())
+        return df[~duplicated].reset_index(drop=True)
+
+    def _tax_record(self, **amounts: Any) -> TaxRecord:
+        if self.fixed_point:
+            return TaxRecord.from_minor_units(
+                **{k: int(v) for k, v in amounts.items()}
+            )
+        return TaxRecord(**{k: float(v) for k, v in amounts.items()})
+
+    def _build_tax_report(self, *frames: pd.DataFrame) -> TaxReport:
+        df = pd.concat(frames, ignore_index=True)
+        fields = df.columns.drop("Year")
+        df[fields] = df[fields].fillna(0)
+        if self.fixed_point:
+            df[fields] = df[fields].astype(np.int64)
+        tax_report = TaxReport()
+        for year, amounts in df.groupby("Year")[fields].sum().iterrows():
+            tax_report[int(year)] = self._tax_record(**amounts)
+        return tax_report
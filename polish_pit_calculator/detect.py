@@ -0,0 +1,70 @@
+import csv
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Type
+
+from polish_pit_calculator.coinbase import CoinbaseTaxReporter
+from polish_pit_calculator.config import TaxReporter
+from polish_pit_calculator.ib import IBTradeCashTaxReporter
+from polish_pit_calculator.raw import RawTaxReporter
+from polish_pit_calculator.revolut import RevolutInterestTaxReporter
+from polish_pit_calculator.schwab import SchwabEmployeeSponsoredTaxReporter
+from polish_pit_calculator.utils import open_binary, peek
+
+HEADER_SIZE = 4096
+HEADER_LINES = 8
+
+PREFIX_SIGNATURES: list[tuple[Type[TaxReporter], bytes, bytes]] = [
+    (IBTradeCashTaxReporter, b"Statement,", b"Statement,"),
+    (IBTradeCashTaxReporter, b"<", b"<FlexQueryResponse"),
+    (SchwabEmployeeSponsoredTaxReporter, b"{", b'"Transactions"'),
+]
+
+COLUMN_SIGNATURES: list[tuple[Type[TaxReporter], set[str]]] = [
+    (
+        SchwabEmployeeSponsoredTaxReporter,
+        {"Date", "Action", "Symbol", "Quantity", "FeesAndCommissions"},
+    ),
+    (
+        CoinbaseTaxReporter,
+        {"Timestamp", "Transaction Type", "Asset", "Quantity Transacted"},
+    ),
+    (
+        RevolutInterestTaxReporter,
+        {"Completed Date", "Description", "Money in", "Money out"},
+    ),
+    (RawTaxReporter, {"year", "description"}),
+]
+
+
+def detect_tax_reporter(arg: Any) -> Type[TaxReporter] | None:
+    with open_binary(arg) as fp:
+        head = peek(fp, HEADER_SIZE)
+    for tax_reporter_cls, prefix, marker in PREFIX_SIGNATURES:
+        if head.startswith(prefix) and marker in head:
+            return tax_reporter_cls
+    lines = head.decode("utf-8", errors="ignore").splitlines()
+    for row in csv.reader(lines[:HEADER_LINES]):
+        columns = {x.strip() for x in row}
+        for tax_reporter_cls, required in COLUMN_SIGNATURES:
+            if required <= columns:
+                return tax_reporter_cls
+    return None
+
+
+def group_by_tax_reporter(
+    *args: Any, max_workers: int = 4
+) -> dict[Type[TaxReporter], list[Any]]:
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        detected = list(executor.map(detect_tax_reporter, args))
+    unknown = [
+        getattr(arg, "name", str(arg))
+        for arg, tax_reporter_cls in zip(args, detected)
+        if tax_reporter_cls is None
+    ]
+    if unknown:
+        raise ValueError(f"Unknown report format: {', '.join(unknown)}")
+    groups: dict[Type[TaxReporter], list[Any]] = {}
+    for arg, tax_reporter_cls in zip(args, detected):
+        if tax_reporter_cls is not None:
+            groups.setdefault(tax_reporter_cls, []).append(arg)
+    return groups
@@ -1,195 +1,311 @@
-from datetime import datetime
+import xml.etree.ElementTree as ET
 from io import StringIO
+from typing import IO, Any
 
+import numpy as np
 import pandas as pd
 
-from polish_pit_calculator.config import TaxRecord, TaxReport, TaxReporter
-from polish_pit_calculator.utils import fetch_exchange_rates, get_exchange_rate
+from polish_pit_calculator.ledger import LedgerTaxReporter
+from polish_pit_calculator.utils import is_xml, open_binary
 
+SECTIONS = {
+    "Trades": "Date/Time",
+    "Dividends": "Date",
+    "Interest": "Date",
+    "Withholding Tax": "Date",
+}
 
-class IBTradeCashTaxReporter(TaxReporter):
-    def generate(self) -> TaxReport:
-        trades = self._load_trades()
+FLEX_COLUMNS = {
+    "Trades": {
+        "dateTime": "Date/Time",
+        "symbol": "Symbol",
+        "quantity": "Quantity",
+        "proceeds": "Proceeds",
+        "ibCommission": "Comm/Fee",
+        "currency": "Currency",
+    },
+    "Dividends": {
+        "dateTime": "Date",
+        "description": "Description",
+        "amount": "Amount",
+        "currency": "Currency",
+    },
+}
+FLEX_COLUMNS["Interest"] = FLEX_COLUMNS["Dividends"]
+FLEX_COLUMNS["Withholding Tax"] = FLEX_COLUMNS["Dividends"]
+
+DTYPES = {
+    "Header": "str",
+    "Date/Time": "str",
+    "Date": "str",
+    "Symbol": "str",
+    "Description": "str",
+    "Quantity": "float64",
+    "Proceeds": "float64",
+    "Comm/Fee": "float64",
+    "Amount": "float64",
+    "Currency": "str",
+}
+
+CATEGORIES = ["Header", "Currency", "Symbol"]
+
+FLEX_CASH_TYPES = {
+    "Dividends": "Dividends",
+    "Withholding Tax": "Withholding Tax",
+    "Broker Interest Received": "Interest",
+    "Broker Interest Paid": "Interest",
+    "Bond Interest Received": "Interest",
+    "Bond Interest Paid": "Interest",
+}
+
+
+class IBTradeCashTaxReporter(LedgerTaxReporter):
+    allow_unmatched_sales = True
+    symbol_columns = ["Symbol", "Description"]
+    wtax_tolerance = pd.Timedelta(days=7)
+
+    def _load_ledger(self) -> pd.DataFrame:
+        sections = self._read_sections()
+        trades = self._load_trades(sections)
+        wtax = self._load_withholding(sections)
         dividends = self._load_dividends_or_interests(
+            sections,
+            wtax,
             prefix="Dividends",
+            kind="Dividend",
             pattern=r"\s*\([^()]*\)\s*$",
             wtax_pattern=r"\s-\s?.*$",
         )
         interests = self._load_dividends_or_interests(
+            sections,
+            wtax,
             prefix="Interest",
+            kind="Interest",
             pattern=r"^[A-Z]+\s+",
             wtax_pattern=r"^.*?\bon\b\s*",
         )
-        min_year = int(
-            min(df["Year"].min() for df in [trades, dividends, interests])
+        unmatched = wtax[~wtax["Matched"]]
+        withholding = pd.DataFrame(
+            {
+                "Date": unmatched["Date"],
+                "Kind": "Withholding",
+                "Symbol": unmatched["Description"],
+                "Amount": -unmatched["Amount"],
+                "Currency": unmatched["Currency"],
+            }
         )
+        frames = [trades, dividends, interests, withholding]
+        frames = [x for x in frames if not x.empty]
+        return pd.concat(frames or [trades], ignore_index=True)
 
-        tax_report = TaxReport()
-        for year in range(min_year, datetime.now().year + 1):
-            revenue = 0.0
-            cost = 0.0
-            interest = 0.0
-            interest_wtax = 0.0
-            dividend = 0.0
-            dividend_wtax = 0.0
-
-            if trades is not None:
-                trades_year = trades[trades["Year"] == year]
-                revenue = trades_year["sell_price_pln"].sum()
-                cost = trades_year["buy_price_pln"].sum()
-
-            if dividends is not None:
-                dividends_year = dividends[dividends["Year"] == year]
-                dividend = dividends_year["Amount_pln"].sum()
-                dividend_wtax = dividends_year["Amount_wtax_pln"].sum()
-
-            if interests is not None:
-                interests_year = interests[interests["Year"] == year]
-                interest = interests_year["Amount_pln"].sum()
-                interest_wtax = interests_year["Amount_wtax_pln"].sum()
-
-            tax_report[year] = TaxRecord(
-                trade_revenue=revenue,
-                trade_cost=cost,
-                foreign_interest=interest + dividend,
-                foreign_interest_withholding_tax=interest_wtax + dividend_wtax,
-            )
-
-        return tax_report
-
-    def _load_trades(self) -> pd.DataFrame:
-        df = self._load_report("Trades", "Date/Time")
+    def _load_trades(
+        self, sections: dict[str, list[pd.DataFrame]]
+    ) -> pd.DataFrame:
+        df = self._compact(self._load_report(sections, "Trades"), CATEGORIES)
         df = (
             df[df["Header"] == "Data"]
             .sort_values(by=["Date/Time"])
             .reset_index(drop=True)
         )
-        df["Quantity"] = (
-            df["Quantity"]
-            .apply(lambda x: x.replace(",", "") if isinstance(x, str) else x)
-            .astype(float)
+        df["Quantity"] = df["Quantity"].astype(float)
+        self.transactions_["Trades"] = df
+        buy = df["Quantity"] > 0
+        return pd.DataFrame(
+            {
+                "Date": df["Date/Time"],
+                "Kind": np.where(buy, "Buy", "Sell"),
+                "Symbol": df["Symbol"],
+                "Quantity": df["Quantity"].abs(),
+                "Amount": (df["Proceeds"] + df["Comm/Fee"]).where(
+                    ~buy, -(df["Proceeds"] + df["Comm/Fee"])
+                ),
+                "Currency": df["Currency"],
+            }
         )
-        df["Type"] = df["Quantity"].apply(lambda x: "BUY" if x > 0 else "SELL")
-        df["Price"] = (df["Proceeds"] + df["Comm/Fee"]) / -df["Quantity"]
-        df["Quantity"] = df["Quantity"].abs()
-        min_year = df["Date/Time"].dt.date.min().year
-        exc_rates = fetch_exchange_rates(min_year)
-        trades = []
-        for _, x in df.groupby("Symbol"):
-            x = x.sort_values("Date/Time")
-            x_buy = x[x["Type"] == "BUY"].reset_index(drop=True)
-            x_sell = x[x["Type"] == "SELL"].reset_index(drop=True)
-            trade = []
-            buy_idx = 0
-            sell_idx = 0
-            while buy_idx < len(x_buy) and sell_idx < len(x_sell):
-                buy = x_buy.iloc[buy_idx]
-                buy_exchange_rate = get_exchange_rate(
-                    buy["Currency"],
-                    buy["Date/Time"].date(),
-                    exc_rates,
-                )
-                sell = x_sell.iloc[sell_idx]
-                sell_exchange_rate = get_exchange_rate(
-                    sell["Currency"],
-                    sell["Date/Time"].date(),
-                    exc_rates,
-                )
-                if buy["Quantity"] == sell["Quantity"]:
-                    buy_amount = buy["Price"] * buy["Quantity"]
-                    sell_amount = sell["Price"] * buy["Quantity"]
-                    record = dict(
-                        buy_price=buy_amount,
-                        buy_price_pln=buy_amount * buy_exchange_rate,
-                        sell_price=sell_amount,
-                        sell_price_pln=sell_amount * sell_exchange_rate,
-                        Year=sell["Year"],
-                    )
-                    trade.append(record)
-                    buy_idx += 1
-                    sell_idx += 1
-                elif buy["Quantity"] < sell["Quantity"]:
-                    sell = sell.copy()
-                    sell["Quantity"] = buy["Quantity"]
-                    x_sell.at[sell_idx, "Quantity"] -= buy["Quantity"]
-                    buy_amount = buy["Price"] * buy["Quantity"]
-                    sell_amount = sell["Price"] * buy["Quantity"]
-                    record = dict(
-                        buy_price=buy_amount,
-                        buy_price_pln=buy_amount * buy_exchange_rate,
-                        sell_price=sell_amount,
-                        sell_price_pln=sell_amount * sell_exchange_rate,
-                        Year=sell["Year"],
-                    )
-                    trade.append(record)
-                    buy_idx += 1
-                else:
-                    buy = buy.copy()
-                    buy["Quantity"] = sell["Quantity"]
-                    x_buy.at[buy_idx, "Quantity"] -= sell["Quantity"]
-                    buy_amount = buy["Price"] * sell["Quantity"]
-                    sell_amount = sell["Price"] * sell["Quantity"]
-                    record = dict(
-                        buy_price=buy_amount,
-                        buy_price_pln=buy_amount * buy_exchange_rate,
-                        sell_price=sell_amount,
-                        sell_price_pln=sell_amount * sell_exchange_rate,
-                        Year=sell["Year"],
-                    )
-                    trade.append(record)
-                    sell_idx += 1
-            trades.extend(trade)
-        return pd.DataFrame(trades)
+
+    def _load_withholding(
+        self, sections: dict[str, list[pd.DataFrame]]
+    ) -> pd.DataFrame:
+        keys = ["Currency", "Description", "Date"]
+        wtax = self._load_report(sections, "Withholding Tax")
+        wtax = wtax.groupby(keys, as_index=False)["Amount"].sum()
+        wtax = wtax.sort_values("Date", kind="stable").reset_index(drop=True)
+        wtax["Year"] = wtax["Date"].dt.year
+        wtax["Matched"] = False
+        self.transactions_["Withholding Tax"] = wtax
+        return wtax
 
     def _load_dividends_or_interests(
         self,
+        sections: dict[str, list[pd.DataFrame]],
+        wtax: pd.DataFrame,
         prefix: str,
+        kind: str,
         pattern: str,
         wtax_pattern: str,
     ) -> pd.DataFrame:
-        df = self._load_report(prefix, "Date", pattern)
-        df["Date"] = df["Date"].dt.date
-        wtax = self._load_report("Withholding Tax", "Date", wtax_pattern)
-        wtax["Date"] = wtax["Date"].dt.date
-        df = df[["Currency", "Date", "Description", "Amount"]].merge(
-            wtax,
-            on=["Currency", "Description"],
-            how="left",
-            suffixes=("", "_wtax"),
+        keys = ["Currency", "Description", "Date"]
+        df = self._load_report(sections, prefix, pattern)
+        df = df.groupby(keys, as_index=False)["Amount"].sum()
+        df = df.sort_values("Date", kind="stable").reset_index(drop=True)
+        df["Amount_wtax"] = self._match_withholding(df, wtax, wtax_pattern)
+        df["Year"] = df["Date"].dt.year
+        self.transactions_[prefix] = df
+        payments = pd.DataFrame(
+            {
+                "Date": df["Date"],
+                "Kind": kind,
+                "Symbol": df["Description"],
+                "Amount": df["Amount"],
+                "Currency": df["Currency"],
+            }
         )
-        df = df.fillna({"Amount": 0.0, "Amount_wtax": 0.0})
-        df["Amount_wtax"] = df["Amount_wtax"].abs()
-        min_year = int(min(df["Year"].min(), wtax["Year"].min()))
-        exc_rates = fetch_exchange_rates(min_year)
-        exc_rate = df.apply(
-            lambda x: get_exchange_rate(x["Currency"], x["Date"], exc_rates),
-            axis=1,
+        return pd.concat(
+            [
+                payments,
+                payments.assign(Kind="Withholding", Amount=df["Amount_wtax"])[
+                    df["Amount_wtax"] != 0
+                ],
+            ],
+            ignore_index=True,
         )
-        df["Amount_pln"] = df["Amount"] * exc_rate
-        df["Amount_wtax_pln"] = df["Amount_wtax"] * exc_rate
-        return df
+
+    def _match_withholding(
+        self, df: pd.DataFrame, wtax: pd.DataFrame, pattern: str
+    ) -> pd.Series:
+        by = ["Currency", "Description"]
+        amounts = pd.Series(0.0, index=df.index)
+        payments = df[[*by, "Date"]].assign(Payment=df.index)
+        while not payments.empty:
+            pending = wtax[~wtax["Matched"]]
+            candidates = pending[[*by, "Date"]].assign(
+                Description=pending["Description"].str.replace(
+                    pattern, "", regex=True
+                ),
+                WtaxDate=pending["Date"],
+                Wtax=pending.index,
+            )
+            matches = pd.merge_asof(
+                payments,
+                candidates,
+                on="Date",
+                by=by,
+                tolerance=self.wtax_tolerance,
+                direction="nearest",
+            ).dropna(subset=["Wtax"])
+            if matches.empty:
+                break
+            matches = (
+                matches.assign(
+                    Gap=(matches["Date"] - matches["WtaxDate"]).abs()
+                )
+                .sort_values("Gap", kind="stable")
+                .drop_duplicates("Wtax")
+            )
+            wtax_index = matches["Wtax"].astype(int).to_numpy()
+            amounts[matches["Payment"].to_numpy()] = -wtax.loc[
+                wtax_index, "Amount"
+            ].to_numpy()
+            wtax.loc[wtax_index, "Matched"] = True
+            payments = payments[~payments["Payment"].isin(matches["Payment"])]
+        return amounts
 
     def _load_report(
-        self, prefix: str, date_col: str, regex: str | None = None
+        self,
+        sections: dict[str, list[pd.DataFrame]],
+        prefix: str,
+        regex: str | None = None,
     ) -> pd.DataFrame:
-        reports: list[pd.DataFrame] = []
-        for arg in self.args:
-            content = arg.getvalue().decode("utf-8")
-            io = "".join(
-                x
-                for x in content.splitlines(True)
-                if x.startswith(f"{prefix},")
-            )
-            if not io:
-                continue
-            string_io = StringIO(io)
-            report = pd.read_csv(string_io, parse_dates=[date_col])
-            reports.append(report)
-        df = pd.concat(reports, ignore_index=True)
-        df = df[df[date_col].notna()]
-        df["Year"] = df[date_col].apply(lambda x: x.year)
+        columns = list(FLEX_COLUMNS[prefix].values())
+        reports = sections[prefix] or [
+            pd.DataFrame(
+                {x: pd.Series(dtype=DTYPES[x]) for x in ["Header", *columns]}
+            ).astype({SECTIONS[prefix]: "datetime64[ns]"})
+        ]
+        df = self._concat_reports(prefix, reports, columns)
+        df[SECTIONS[prefix]] = df[SECTIONS[prefix]].astype("datetime64[ns]")
+        df["Year"] = df[SECTIONS[prefix]].dt.year
         if regex is not None:
             df["Description"] = df["Description"].str.replace(
                 regex, "", regex=True
             )
         return df
+
+    def _read_sections(self) -> dict[str, list[pd.DataFrame]]:
+        sections: dict[str, list[pd.DataFrame]] = {x: [] for x in SECTIONS}
+        for reports in self._map_args(self._read_statement):
+            for prefix, report in reports.items():
+                date_col = SECTIONS[prefix]
+                sections[prefix].append(report[report[date_col].notna()])
+        return sections
+
+    def _read_statement(self, arg: Any) -> dict[str, pd.DataFrame]:
+        with open_binary(arg) as fp:
+            if is_xml(fp):
+                return self._read_flex_report(fp)
+            return self._read_csv_report(fp)
+
+    def _read_csv_report(self, fp: IO[bytes]) -> dict[str, pd.DataFrame]:
+        lines: dict[str, list[str]] = {x: [] for x in SECTIONS}
+        for line in fp.read().decode("utf-8").splitlines(True):
+            prefix = line.partition(",")[0]
+            if prefix in lines:
+                lines[prefix].append(line)
+        return {
+            prefix: self._read_csv(
+                StringIO("".join(x)),
+                {
+                    col: DTYPES[col]
+                    for col in ["Header", *FLEX_COLUMNS[prefix].values()]
+                },
+                parse_dates=[SECTIONS[prefix]],
+                thousands=",",
+            )
+            for prefix, x in lines.items()
+            if x
+        }
+
+    def _read_flex_report(self, fp: IO[bytes]) -> dict[str, pd.DataFrame]:
+        rows: dict[str, list[list[Any]]] = {x: [] for x in SECTIONS}
+        parents: list[ET.Element] = []
+        for event, elem in ET.iterparse(fp, events=("start", "end")):
+            if event == "start":
+                parents.append(elem)
+                continue
+            parents.pop()
+            prefix = None
+            if elem.tag == "Trade":
+                if elem.get("levelOfDetail", "EXECUTION") == "EXECUTION":
+                    prefix = "Trades"
+            elif elem.tag == "CashTransaction":
+                prefix = FLEX_CASH_TYPES.get(elem.get("type", ""))
+            if prefix is not None:
+                rows[prefix].append(
+                    [elem.get(x) for x in FLEX_COLUMNS[prefix]]
+                )
+            if parents:
+                parents[-1].remove(elem)
+        reports: dict[str, pd.DataFrame] = {}
+        for prefix, values in rows.items():
+            if not values:
+                continue
+            df = pd.DataFrame(
+                values, columns=list(FLEX_COLUMNS[prefix].values())
+            )
+            dates = pd.to_datetime(
+                df[SECTIONS[prefix]]
+                .str.replace(r"\D", "", regex=True)
+                .str.ljust(14, "0"),
+                format="%Y%m%d%H%M%S",
+            )
+            if prefix == "Trades":
+                df["Header"] = "Data"
+                df["Quantity"] = pd.to_numeric(df["Quantity"])
+                df["Proceeds"] = pd.to_numeric(df["Proceeds"])
+                df["Comm/Fee"] = pd.to_numeric(df["Comm/Fee"])
+            else:
+                dates = dates.dt.normalize()
+                df["Amount"] = pd.to_numeric(df["Amount"])
+            df[SECTIONS[prefix]] = dates
+            reports[prefix] = df
+        return reports
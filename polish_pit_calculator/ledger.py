@@ -0,0 +1,321 @@
+import warnings
+from abc import abstractmethod
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from polish_pit_calculator.config import TaxRecord, TaxReporter
+from polish_pit_calculator.utils import (
+    fetch_exchange_rates,
+    get_exchange_rates,
+)
+
+LEDGER_COLUMNS = {
+    "Date": "datetime64[ns]",
+    "Kind": "string",
+    "Symbol": "string",
+    "Pool": "string",
+    "Quantity": "float64",
+    "Amount": "float64",
+    "Currency": "string",
+    "Fees": "float64",
+}
+
+KIND_FIELDS: dict[str, dict[str, str]] = {
+    "Buy": {},
+    "Sell": {"Fees": "trade_cost"},
+    "Fee": {"Fees": "trade_cost"},
+    "Dividend": {"Amount": "foreign_interest"},
+    "Interest": {"Amount": "foreign_interest"},
+    "Withholding": {"Amount": "foreign_interest_withholding_tax"},
+    "DomesticInterest": {"Amount": "domestic_interest"},
+    "CryptoBuy": {"Amount": "crypto_cost", "Fees": "crypto_cost"},
+    "CryptoSell": {"Amount": "crypto_revenue", "Fees": "crypto_cost"},
+}
+
+QUANTITY_SCALE = 10**8
+
+Lots = tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def to_quantity_units(quantity: pd.Series) -> np.ndarray:
+    return np.round(quantity.to_numpy(dtype=float) * QUANTITY_SCALE).astype(
+        np.int64
+    )
+
+
+def stack_lots(held: Lots | None, rows: pd.DataFrame) -> Lots:
+    index, units, offsets = held or (
+        np.array([], dtype=int),
+        np.array([], dtype=np.int64),
+        np.array([], dtype=np.int64),
+    )
+    return (
+        np.concatenate([index, rows.index]),
+        np.concatenate([units, to_quantity_units(rows["Quantity"])]),
+        np.concatenate([offsets, np.zeros(len(rows), dtype=np.int64)]),
+    )
+
+
+def keep_lots(lots: Lots, remaining: np.ndarray) -> Lots:
+    index, units, offsets = lots
+    keep = remaining > 0
+    return index[keep], remaining[keep], (offsets + units - remaining)[keep]
+
+
+def match_fifo(
+    buys: np.ndarray, sells: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    buy_ends = np.cumsum(buys)
+    sell_ends = np.cumsum(sells)
+    matched = min(
+        buy_ends[-1] if len(buys) else 0, sell_ends[-1] if len(sells) else 0
+    )
+    ends = np.union1d(buy_ends, sell_ends)
+    ends = ends[(ends > 0) & (ends <= matched)]
+    starts = ends - np.diff(ends, prepend=0)
+    return (
+        np.searchsorted(buy_ends, starts, side="right"),
+        np.searchsorted(sell_ends, starts, side="right"),
+        ends - starts,
+        np.minimum(buys, np.maximum(buy_ends - matched, 0)),
+        np.minimum(sells, np.maximum(sell_ends - matched, 0)),
+    )
+
+
+class LedgerTaxReporter(TaxReporter):
+    allow_unmatched_sales = False
+    ledger_: pd.DataFrame | None = None
+    open_positions_: pd.DataFrame | None = None
+
+    @abstractmethod
+    def _load_ledger(self) -> pd.DataFrame:
+        pass
+
+    def generate_iter(self) -> Iterator[tuple[int, TaxRecord]]:
+        ledger = self._normalize_ledger(self._load_ledger())
+        foreign = ledger["Currency"] != "PLN"
+        exc_rates = (
+            fetch_exchange_rates(ledger.loc[foreign, "Date"].dt.year.min())
+            if foreign.any()
+            else {}
+        )
+        (
+            ledger["ExchangeRate"],
+            ledger["ExchangeRateDate"],
+        ) = get_exchange_rates(ledger["Currency"], ledger["Date"], exc_rates)
+        self.ledger_ = ledger
+        cash = dict(tuple(self._cash_flows(ledger).groupby("Year")))
+        open_lots: dict[tuple[str, str], Lots] = {}
+        open_shorts: dict[tuple[str, str], Lots] = {}
+        with self._audit_writer() as audit:
+            for year, rows in ledger.groupby(ledger["Date"].dt.year):
+                trades: list[pd.DataFrame] = []
+                for lots in self._match_lots(rows, open_lots, open_shorts):
+                    lots = self._price_lots(ledger, lots)
+                    if audit is not None:
+                        audit.write(
+                            lots.assign(
+                                BuyAmountPLN=self._from_money(
+                                    lots["BuyAmountPLN"]
+                                ),
+                                SellAmountPLN=self._from_money(
+                                    lots["SellAmountPLN"]
+                                ),
+                            )
+                        )
+                    trades.append(
+                        lots.groupby("Year", as_index=False)[
+                            ["SellAmountPLN", "BuyAmountPLN"]
+                        ]
+                        .sum()
+                        .rename(
+                            columns={
+                                "SellAmountPLN": "trade_revenue",
+                                "BuyAmountPLN": "trade_cost",
+                            }
+                        )
+                    )
+                yield from self._build_tax_report(
+                    cash.get(year, pd.DataFrame({"Year": []})), *trades
+                ).items()
+        if shorts := sorted(
+            {x for (x, _), y in open_shorts.items() if len(y[0])}
+        ):
+            warnings.warn(
+                f"Short sales of {', '.join(shorts)} are not covered by a "
+                "later purchase and are not reported."
+            )
+        remaining = [
+            pd.DataFrame(
+                {"Purchase": x, "Quantity": y / QUANTITY_SCALE, "Offset": z}
+            )
+            for x, y, z in open_lots.values()
+        ]
+        self.open_positions_ = self._open_positions(
+            ledger,
+            pd.concat(remaining, ignore_index=True)
+            if remaining
+            else pd.DataFrame(
+                {"Purchase": [], "Quantity": [], "Offset": []}, dtype=int
+            ),
+        )
+
+    def _normalize_ledger(self, ledger: pd.DataFrame) -> pd.DataFrame:
+        ledger = ledger.reindex(columns=list(LEDGER_COLUMNS)).fillna(
+            {"Pool": "", "Quantity": 0.0, "Amount": 0.0, "Fees": 0.0}
+        )
+        unknown = ledger.loc[~ledger["Kind"].isin(KIND_FIELDS), "Kind"]
+        if not unknown.empty:
+            raise ValueError(f"Unknown ledger kind: {unknown.iloc[0]}")
+        dtypes = LEDGER_COLUMNS
+        if self.low_memory:
+            dtypes = {
+                k: "category" if v == "string" else v
+                for k, v in LEDGER_COLUMNS.items()
+            }
+        return (
+            ledger.astype(dtypes)
+            .sort_values("Date", kind="stable")
+            .reset_index(drop=True)
+        )
+
+    def _cash_flows(self, ledger: pd.DataFrame) -> pd.DataFrame:
+        kind = ledger["Kind"]
+        cash = pd.DataFrame({"Year": ledger["Date"].dt.year})
+        for column in ["Amount", "Fees"]:
+            fields = kind.map(
+                {k: v.get(column) for k, v in KIND_FIELDS.items()}
+            )
+            for field in fields.dropna().unique():
+                amount = ledger[column].where(fields == field, 0.0)
+                cash[field] = cash.get(field, 0.0) + amount
+        for field in cash.columns.drop("Year"):
+            cash[field] = self._to_pln(cash[field], ledger["ExchangeRate"])
+        return cash[kind.isin([k for k, v in KIND_FIELDS.items() if v])]
+
+    def _match_lots(
+        self,
+        ledger: pd.DataFrame,
+        open_lots: dict[tuple[str, str], Lots],
+        open_shorts: dict[tuple[str, str], Lots],
+    ) -> Iterator[pd.DataFrame]:
+        trades = ledger[ledger["Kind"].isin(["Buy", "Sell"])]
+        for (symbol, pool), group in trades.groupby(
+            ["Symbol", "Pool"], sort=False, observed=True
+        ):
+            buy_lots = stack_lots(
+                open_lots.get((symbol, pool)), group[group["Kind"] == "Buy"]
+            )
+            sell_lots = stack_lots(
+                open_shorts.get((symbol, pool)), group[group["Kind"] == "Sell"]
+            )
+            buy_index, buy_units, buy_offsets = buy_lots
+            sell_index, sell_units, sell_offsets = sell_lots
+            buy, sell, quantity, buy_remaining, sell_remaining = match_fifo(
+                buy_units, sell_units
+            )
+            if not self.allow_unmatched_sales and sell_remaining.any():
+                raise ValueError(f"Not enough open {symbol} lots to sell.")
+            starts = np.cumsum(quantity) - quantity
+            open_lots[symbol, pool] = keep_lots(buy_lots, buy_remaining)
+            open_shorts[symbol, pool] = keep_lots(sell_lots, sell_remaining)
+            yield pd.DataFrame(
+                {
+                    "Sale": sell_index[sell],
+                    "Purchase": buy_index[buy],
+                    "Quantity": quantity / QUANTITY_SCALE,
+                    "BuyOffset": buy_offsets[buy]
+                    + starts
+                    - (np.cumsum(buy_units) - buy_units)[buy],
+                    "SellOffset": sell_offsets[sell]
+                    + starts
+                    - (np.cumsum(sell_units) - sell_units)[sell],
+                }
+            )
+
+    def _price_lots(
+        self, ledger: pd.DataFrame, lots: pd.DataFrame
+    ) -> pd.DataFrame:
+        sales = ledger.loc[lots["Sale"]]
+        purchases = ledger.loc[lots["Purchase"]]
+        quantity = lots["Quantity"].to_numpy()
+        buy_amount = (
+            quantity
+            * purchases["Amount"].to_numpy()
+            / purchases["Quantity"].to_numpy()
+        )
+        sell_amount = (
+            quantity
+            * sales["Amount"].to_numpy()
+            / sales["Quantity"].to_numpy()
+        )
+        return lots.assign(
+            Year=np.maximum(
+                sales["Date"].dt.year.to_numpy(),
+                purchases["Date"].dt.year.to_numpy(),
+            ),
+            Symbol=purchases["Symbol"].to_numpy(),
+            Currency=sales["Currency"].to_numpy(),
+            BuyDate=purchases["Date"].dt.normalize().to_numpy(),
+            SellDate=sales["Date"].dt.normalize().to_numpy(),
+            BuyAmount=buy_amount,
+            SellAmount=sell_amount,
+            BuyExchangeRateDate=purchases["ExchangeRateDate"].to_numpy(),
+            BuyExchangeRate=purchases["ExchangeRate"].to_numpy(),
+            SellExchangeRateDate=sales["ExchangeRateDate"].to_numpy(),
+            SellExchangeRate=sales["ExchangeRate"].to_numpy(),
+            BuyAmountPLN=self._lots_to_pln(
+                purchases, buy_amount, lots["BuyOffset"], lots["Quantity"]
+            ),
+            SellAmountPLN=self._lots_to_pln(
+                sales, sell_amount, lots["SellOffset"], lots["Quantity"]
+            ),
+        )
+
+    def _lots_to_pln(
+        self,
+        rows: pd.DataFrame,
+        amount: np.ndarray,
+        offset: pd.Series,
+        quantity: pd.Series,
+    ) -> np.ndarray:
+        rate = rows["ExchangeRate"].to_numpy()
+        if not self.fixed_point:
+            return self._to_pln(amount, rate)
+        total = self._to_pln(rows["Amount"].to_numpy(), rate)
+        size = to_quantity_units(rows["Quantity"])
+        start = offset.to_numpy(dtype=np.int64)
+        end = start + to_quantity_units(quantity)
+        return (
+            np.round(total * (end / size)) - np.round(total * (start / size))
+        ).astype(np.int64)
+
+    def _open_positions(
+        self, ledger: pd.DataFrame, remaining: pd.DataFrame
+    ) -> pd.DataFrame:
+        purchases = ledger.loc[remaining["Purchase"]]
+        quantity = remaining["Quantity"].to_numpy()
+        amount = quantity * (
+            purchases["Amount"].to_numpy() / purchases["Quantity"].to_numpy()
+        )
+        return pd.DataFrame(
+            {
+                "Symbol": purchases["Symbol"].to_numpy(),
+                "Type": purchases["Pool"].to_numpy(),
+                "Date": purchases["Date"].dt.normalize().to_numpy(),
+                "Quantity": quantity,
+                "Currency": purchases["Currency"].to_numpy(),
+                "Amount": amount,
+                "ExchangeRate": purchases["ExchangeRate"].to_numpy(),
+                "AmountPLN": self._from_money(
+                    self._lots_to_pln(
+                        purchases,
+                        amount,
+                        remaining["Offset"],
+                        remaining["Quantity"],
+                    )
+                ),
+            }
+        )
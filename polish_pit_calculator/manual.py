@@ -1,11 +1,14 @@
-from polish_pit_calculator.config import TaxRecord, TaxReport, TaxReporter
+from typing import Any, Iterator
+
+from polish_pit_calculator.config import TaxRecord, TaxReporter
 
 
 class ManualTaxReporter(TaxReporter):
-    def generate(self) -> TaxReport:
+    @property
+    def options(self) -> dict[str, Any]:
+        return super().options | self.args[0]
+
+    def generate_iter(self) -> Iterator[tuple[int, TaxRecord]]:
         year = self.args[0]["year"]
         tax_data = self.args[0]["tax_data"]
-        tax_record = TaxRecord(**tax_data)
-        tax_report = TaxReport()
-        tax_report[year] = tax_record
-        return tax_report
+        yield year, TaxRecord(**tax_data)
@@ -2,6 +2,7 @@ from datetime import date, datetime, timedelta
 from functools import partial
 
 import numpy as np
+import pandas as pd
 from scipy.optimize import minimize
 
 
@@ -13,12 +14,16 @@ class SavingsForTaxOptimizer:
         payment_day: int = 30,
         delay: int = 14,
         tolerance: float = 1e-2,
+        capitalization: str = "D",
+        withholding: bool = False,
     ) -> None:
         self.tax_rate = tax_rate
         self.payment_month = payment_month
         self.payment_day = payment_day
         self.delay = delay
         self.tolerance = tolerance
+        self.capitalization = capitalization
+        self.withholding = withholding
         self.required_cash_: float | None = None
         self.msg_: str | None = None
 
@@ -27,24 +32,25 @@ class SavingsForTaxOptimizer:
         tax: float,
         year: int,
         savings: float,
-        interest_rate: float,
+        interest_rate: float | pd.Series,
     ) -> "SavingsForTaxOptimizer":
         taxes = {
             date(year + 1, self.payment_month, self.payment_day): tax,
             date(year + 2, self.payment_month, self.payment_day): 0.0,
         }
+        days = pd.date_range(
+            datetime.today().date() + timedelta(days=1),
+            max(taxes) - timedelta(days=self.delay),
+        )
         fun = partial(
             self._estimate_future_abs_savings,
-            interest_rate=interest_rate,
+            days=days,
+            interest_rates=self._get_daily_interest_rates(days, interest_rate),
             taxes=taxes,
         )
         res = minimize(fun=fun, x0=savings, method="Nelder-Mead")
         required_cash = res.x[0]
-        final_cash = self._estimate_future_abs_savings(
-            initial_savings=required_cash,
-            taxes=taxes,
-            interest_rate=interest_rate,
-        )
+        final_cash = fun(required_cash)
         assert np.isclose(final_cash, 0.0, atol=self.tolerance)
         msg = f"Current savings: {savings:,.2f} PLN. Required savings: {required_cash:,.2f} PLN."
         if (diff := required_cash - savings) < -5e-3:
@@ -57,27 +63,72 @@ class SavingsForTaxOptimizer:
         self.msg_ = msg
         return self
 
+    def _get_daily_interest_rates(
+        self, days: pd.DatetimeIndex, interest_rate: float | pd.Series
+    ) -> np.ndarray:
+        if isinstance(interest_rate, pd.Series):
+            schedule = interest_rate.set_axis(
+                pd.to_datetime(interest_rate.index)
+            ).sort_index()
+            rates = (
+                schedule.reindex(schedule.index.union(days))
+                .ffill()
+                .bfill()
+                .reindex(days)
+                .to_numpy(dtype=float)
+            )
+        else:
+            rates = np.full(len(days), interest_rate, dtype=float)
+        return np.maximum(rates, 0.0) / 365
+
     def _estimate_future_abs_savings(
         self,
         initial_savings: float,
-        interest_rate: float,
+        days: pd.DatetimeIndex,
+        interest_rates: np.ndarray,
         taxes: dict[date, float],
     ) -> float:
-        savings = initial_savings
+        savings = float(np.ravel(initial_savings)[0])
+        pending = 0.0
         taxes = taxes.copy()
-        curr_date = datetime.today().date()
-        max_date = max(taxes)
-        while curr_date + timedelta(days=self.delay) < max_date:
-            curr_date += timedelta(days=1)
-            curr_tax_date = date(
-                curr_date.year + 1, self.payment_month, self.payment_day
+        periods = days.to_period(self.capitalization)
+        capitalized = np.append(periods[1:] != periods[:-1], True)
+        net = 1.0 - self.tax_rate if self.withholding else 1.0
+        due = days + pd.Timedelta(days=self.delay)
+        payments = np.flatnonzero(
+            (due.month == self.payment_month) & (due.day == self.payment_day)
+        )
+        bounds = np.unique(np.concatenate([[0], payments + 1, [len(days)]]))
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            rates = (
+                interest_rates[lo:hi] if savings >= 0.0 else np.zeros(hi - lo)
             )
-            daily_savings = max(savings * interest_rate / 365, 0.0)
-            savings += daily_savings
-            daily_tax = daily_savings * self.tax_rate
-            if curr_tax_date in taxes:
-                taxes[curr_tax_date] += daily_tax
+            accrued = np.cumsum(rates)
+            caps = np.flatnonzero(capitalized[lo:hi])
+            if len(caps):
+                period_rates = np.diff(accrued[caps], prepend=0.0)
+                growth = np.cumprod(1.0 + net * period_rates)
+                principal = savings * np.concatenate([[1.0], growth[:-1]])
+                principal[1:] += pending * net * growth[:-1] / growth[0]
+                interest = principal * period_rates
+                interest[0] += pending
+                savings = principal[-1] + net * interest[-1]
+                pending = savings * (accrued[-1] - accrued[caps[-1]])
+                if not self.withholding:
+                    for year, amount in (
+                        pd.Series(interest, index=days[lo:hi][caps].year)
+                        .groupby(level=0)
+                        .sum()
+                        .items()
+                    ):
+                        tax_date = date(
+                            year + 1, self.payment_month, self.payment_day
+                        )
+                        taxes[tax_date] = (
+                            taxes.get(tax_date, 0.0) + amount * self.tax_rate
+                        )
             else:
-                taxes[curr_tax_date] = daily_tax
-            savings -= taxes.get(curr_date + timedelta(days=self.delay), 0.0)
-        return np.abs(savings)
+                pending += savings * accrued[-1]
+            if hi - 1 in payments:
+                savings -= taxes.get(due[hi - 1].date(), 0.0)
+        return np.abs(savings + net * pending)
@@ -1,21 +1,18 @@
+from typing import Iterator
+
 import pandas as pd
 
-from polish_pit_calculator.config import TaxRecord, TaxReport, TaxReporter
+from polish_pit_calculator.config import TaxRecord, TaxReporter
 
 
 class RawTaxReporter(TaxReporter):
-    def generate(self) -> TaxReport:
+    def generate_iter(self) -> Iterator[tuple[int, TaxRecord]]:
         df = self._load_report()
-        tax_report = TaxReport()
         for year, tax_record_data in (
             df.drop(columns="description").groupby("year").sum().iterrows()
         ):
-            tax_report[year] = TaxRecord(**tax_record_data)
-        return tax_report
+            yield int(year), TaxRecord(**tax_record_data)
 
     def _load_report(self) -> pd.DataFrame:
-        reports = []
-        for arg in self.args:
-            report = pd.read_csv(arg)
-            reports.append(report)
+        reports = self._map_args(pd.read_csv)
         return pd.concat(reports, ignore_index=True).fillna(0.0)
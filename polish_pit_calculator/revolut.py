@@ -1,24 +1,32 @@
 import pandas as pd
 
-from polish_pit_calculator.config import TaxRecord, TaxReport, TaxReporter
+from polish_pit_calculator.ledger import LedgerTaxReporter
 
+COLUMNS = {
+    "Completed Date": "str",
+    "Description": "str",
+    "Money out": "str",
+    "Money in": "str",
+    "Balance": "str",
+}
 
-class RevolutInterestTaxReporter(TaxReporter):
-    def generate(self) -> TaxReport:
+
+class RevolutInterestTaxReporter(LedgerTaxReporter):
+    def _load_ledger(self) -> pd.DataFrame:
         df = self._load_report()
-        tax_report = TaxReport()
-        for year, df_year in df.groupby("Year"):
-            tax_report[year] = TaxRecord(
-                domestic_interest=df_year["Money in"].sum()
-            )
-        return tax_report
+        self.transactions_["Transactions"] = df
+        return pd.DataFrame(
+            {
+                "Date": df["Completed Date"],
+                "Kind": "DomesticInterest",
+                "Amount": df["Money in"],
+                "Currency": "PLN",
+            }
+        )
 
     def _load_report(self) -> pd.DataFrame:
-        reports = []
-        for arg in self.args:
-            report = pd.read_csv(arg)
-            reports.append(report)
-        df = pd.concat(reports, ignore_index=True)
+        reports = self._map_args(lambda x: self._read_csv(x, COLUMNS))
+        df = self._concat_reports("Transactions", reports)
         df = df[df["Description"].str.startswith("Gross interest")]
         df["Completed Date"] = pd.to_datetime(
             df["Completed Date"], dayfirst=True
@@ -28,7 +36,7 @@ class RevolutInterestTaxReporter(TaxReporter):
         df["Money in"] = (
             df["Money in"]
             .str.replace(",", "", regex=False)
-            .str.extract(r"([+-]?\d+(?:\.\d*)?)")
+            .str.extract(r"([+-]?\d+(?:\.\d*)?)")[0]
             .astype(float)
         )
         return df
@@ -1,107 +1,129 @@
-from collections import defaultdict
+from io import TextIOWrapper
+from typing import IO, Any
 
+import numpy as np
 import pandas as pd
 
-from polish_pit_calculator.config import TaxRecord, TaxReport, TaxReporter
-from polish_pit_calculator.utils import fetch_exchange_rates, get_exchange_rate
+from polish_pit_calculator.ledger import LedgerTaxReporter
+from polish_pit_calculator.utils import is_json, iter_json_array, open_binary
 
+ACTIONS = [
+    "Deposit",
+    "Sale",
+    "Lapse",
+    "Dividend",
+    "Tax Withholding",
+    "Wire Transfer",
+]
 
-class SchwabEmployeeSponsoredTaxReporter(TaxReporter):
-    def generate(self) -> TaxReport:
+ACTION_KINDS = {
+    "Deposit": "Buy",
+    "Sale": "Sell",
+    "Dividend": "Dividend",
+    "Tax Withholding": "Withholding",
+    "Wire Transfer": "Fee",
+}
+
+COLUMNS = {
+    "Date": "str",
+    "Action": "str",
+    "Symbol": "str",
+    "Quantity": "float64",
+    "Description": "str",
+    "FeesAndCommissions": "str",
+    "Amount": "str",
+    "Currency": "str",
+    "Type": "str",
+    "Shares": "float64",
+    "SalePrice": "str",
+    "SubscriptionDate": "str",
+    "PurchaseDate": "str",
+    "PurchasePrice": "str",
+    "DispositionType": "str",
+    "GrantId": "float64",
+    "VestDate": "str",
+    "VestFairMarketValue": "str",
+    "AwardDate": "str",
+    "FairMarketValuePrice": "str",
+}
+
+CATEGORIES = [
+    "Action",
+    "Symbol",
+    "Description",
+    "Currency",
+    "Type",
+    "DispositionType",
+]
+
+
+class SchwabEmployeeSponsoredTaxReporter(LedgerTaxReporter):
+    year_columns = ["Date"]
+
+    def _load_ledger(self) -> pd.DataFrame:
         df = self._load_report()
-        min_year = df["Date"].apply(lambda x: x.year).min()
-        exc_rates = fetch_exchange_rates(min_year)
-        remaining: dict[str, list[pd.Series]] = defaultdict(list)
-        tax_report = TaxReport()
-        for _, row in df.iterrows():
-            year = row["Date"].year
-            exc_rate = get_exchange_rate(
-                row["Currency"], row["Date"], exc_rates
-            )
-            if row["Action"] == "Deposit":
-                for _ in range(int(row["Quantity"])):
-                    remaining[row["Description"]].append(row)
-            elif row["Action"] == "Sale":
-                tax_record = TaxRecord(
-                    trade_cost=row["FeesAndCommissions"] * exc_rate
-                )
-                for _ in range(int(row["Shares"])):
-                    sold_row = remaining[row["Type"]].pop(0)
-                    sold_exc_rate = get_exchange_rate(
-                        sold_row["Currency"], sold_row["Date"], exc_rates
-                    )
-                    tax_record += TaxRecord(
-                        trade_revenue=row["SalePrice"] * exc_rate,
-                        trade_cost=sold_row["PurchasePrice"] * sold_exc_rate,
-                    )
-                tax_report += TaxReport({year: tax_record})
-            elif row["Action"] == "Lapse":
-                pass
-            elif row["Action"] == "Dividend":
-                tax_record = TaxRecord(
-                    foreign_interest=row["Amount"] * exc_rate
-                )
-                tax_report += TaxReport({year: tax_record})
-            elif row["Action"] == "Tax Withholding":
-                tax_record = TaxRecord(
-                    foreign_interest_withholding_tax=-row["Amount"] * exc_rate
-                )
-                tax_report += TaxReport({year: tax_record})
-            elif row["Action"] == "Wire Transfer":
-                tax_record = TaxRecord(
-                    trade_cost=-row["FeesAndCommissions"] * exc_rate
-                )
-                tax_report += TaxReport({year: tax_record})
-            else:
-                raise ValueError(f"Unknown action: {row['Action']}")
-        return tax_report
+        unknown = df.loc[~df["Action"].isin(ACTIONS), "Action"]
+        if not unknown.empty:
+            raise ValueError(f"Unknown action: {unknown.iloc[0]}")
+        self.transactions_["Transactions"] = df
+        missing = pd.Series(np.nan, index=df.index)
+        action = df["Action"].to_numpy()
+        deposit = action == "Deposit"
+        sale = action == "Sale"
+        quantity = np.where(
+            deposit,
+            df["Quantity"].to_numpy(dtype=float, na_value=np.nan),
+            df.get("Shares", missing).to_numpy(dtype=float, na_value=np.nan),
+        )
+        fees = df["FeesAndCommissions"].fillna(0.0).to_numpy()
+        ledger = pd.DataFrame(
+            {
+                "Date": pd.to_datetime(df["Date"]),
+                "Kind": df["Action"].map(ACTION_KINDS),
+                "Symbol": df["Symbol"],
+                "Pool": np.where(
+                    deposit, df["Description"], df.get("Type", missing)
+                ),
+                "Quantity": quantity,
+                "Amount": np.select(
+                    [deposit, sale, action == "Tax Withholding"],
+                    [
+                        quantity * df["PurchasePrice"].to_numpy(),
+                        quantity * df["SalePrice"].to_numpy(),
+                        -df["Amount"].to_numpy(),
+                    ],
+                    df["Amount"].to_numpy(),
+                ),
+                "Currency": df["Currency"],
+                "Fees": np.select(
+                    [sale, action == "Wire Transfer"], [fees, -fees], 0.0
+                ),
+            }
+        )
+        return ledger[ledger["Kind"].notna()]
 
     def _load_report(self) -> pd.DataFrame:
-        reports: list[pd.DataFrame] = []
-        for arg in self.args:
-            report = pd.read_csv(arg)
-            if reports:
-                pd.testing.assert_index_equal(
-                    report.columns, reports[-1].columns, check_order=False
-                )
-                report = report[reports[-1].columns]
-            reports.append(report)
         reports = sorted(
-            reports,
-            key=lambda x: pd.to_datetime(x["Date"]).max(),
+            self._map_args(self._read_report),
+            key=lambda x: pd.to_datetime(pd.Series(x["Date"].unique())).max(),
             reverse=True,
         )
-        df = pd.concat(reports, ignore_index=True).astype(
-            {"Shares": "Int64", "Quantity": "Int64", "GrantId": "Int64"}
+        reports = [x[::-1] for x in reports[::-1]]
+        offsets = np.cumsum([0] + [len(x) for x in reports[:-1]])
+        df = pd.concat(reports, ignore_index=True)
+        df = df.astype(
+            {x: "Int64" for x in ["Shares", "Quantity", "GrantId"] if x in df}
         )
-        df["Date"] = pd.to_datetime(df["Date"])
-        df_notnull = df[df["Date"].notna()].dropna(axis=1, how="all")
-        curr = 0
-        data = defaultdict(list)
-        for i, row in df.iterrows():
-            if pd.isna(row["Date"]):
-                data[curr].append(row)
-            else:
-                if curr in data:
-                    data[curr] = (
-                        pd.DataFrame(data[curr])
-                        .dropna(axis=1, how="all")
-                        .assign(action_id=curr)
-                    )
-                curr = i
-        if curr in data:
-            data[curr] = (
-                pd.DataFrame(data[curr])
-                .dropna(axis=1, how="all")
-                .assign(action_id=curr)
-            )
-        df_additional = (
-            pd.concat(data.values())
-            .dropna(axis=1, how="all")
-            .set_index("action_id")
-            .rename_axis(index=None)
-        )
-        df = df_notnull.join(df_additional)
+        df = self._drop_duplicates(
+            "Transactions",
+            df,
+            sources=np.repeat(
+                np.arange(len(reports)), [len(x) for x in reports]
+            ),
+            columns=list(df.columns.drop("Transaction")),
+            blocks=df["Transaction"].to_numpy()
+            + np.repeat(offsets, [len(x) for x in reports]),
+        ).drop(columns="Transaction")
         df["Date"] = pd.to_datetime(df["Date"]).dt.date
         for col in [
             "Amount",
@@ -126,4 +148,67 @@ class SchwabEmployeeSponsoredTaxReporter(TaxReporter):
                 df["Currency"] = currency
             else:
                 df["Currency"] = df["Currency"].combine_first(currency)
-        return df[::-1]
+        return self._compact(df, CATEGORIES)
+
+    def _read_report(self, arg: Any) -> pd.DataFrame:
+        with open_binary(arg) as fp:
+            if is_json(fp):
+                return self._read_json_report(fp)
+            return self._read_csv_report(fp)
+
+    def _read_csv_report(self, fp: IO[bytes]) -> pd.DataFrame:
+        main: list[pd.DataFrame] = []
+        details: list[pd.DataFrame] = []
+        offset = 0
+        for report in self._read_csv_chunks(fp, COLUMNS):
+            is_main = report["Date"].notna()
+            transaction = is_main.cumsum() + offset
+            offset = transaction.iloc[-1] if len(transaction) else offset
+            main.append(
+                report[is_main]
+                .dropna(axis=1, how="all")
+                .assign(Transaction=transaction[is_main])
+            )
+            details.append(
+                report[~is_main]
+                .dropna(axis=1, how="all")
+                .assign(Transaction=transaction[~is_main])
+            )
+        return pd.concat(main, ignore_index=True).merge(
+            pd.concat(details, ignore_index=True),
+            on="Transaction",
+            how="left",
+        )
+
+    def _read_json_report(self, fp: IO[bytes]) -> pd.DataFrame:
+        text = TextIOWrapper(fp, encoding="utf-8-sig")
+        rows: list[dict[str, Any]] = []
+        reports: list[pd.DataFrame] = []
+        for i, transaction in enumerate(
+            iter_json_array(text, "Transactions"), start=1
+        ):
+            details = transaction.pop("TransactionDetails", None) or [{}]
+            for detail in details:
+                row = {**transaction, **detail.get("Details", {})}
+                rows.append(
+                    {
+                        k: v
+                        for k, v in row.items()
+                        if v not in (None, "")
+                        and (k in COLUMNS or not self.low_memory)
+                    }
+                    | {"Transaction": i}
+                )
+            if self.low_memory and len(rows) >= self.chunk_size:
+                reports.append(pd.DataFrame(rows))
+                rows = []
+        text.detach()
+        if reports:
+            df = pd.concat([*reports, pd.DataFrame(rows)], ignore_index=True)
+        else:
+            df = pd.DataFrame(rows)
+        for col in df.columns:
+            numeric = pd.to_numeric(df[col], errors="coerce")
+            if numeric.count() == df[col].count():
+                df[col] = numeric
+        return df
@@ -0,0 +1,264 @@
+import argparse
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from datetime import datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import Any, Type
+from urllib.parse import urlparse
+
+import numpy as np
+
+from polish_pit_calculator.coinbase import CoinbaseTaxReporter
+from polish_pit_calculator.config import TaxReport, TaxReporter
+from polish_pit_calculator.ib import IBTradeCashTaxReporter
+from polish_pit_calculator.raw import RawTaxReporter
+from polish_pit_calculator.revolut import RevolutInterestTaxReporter
+from polish_pit_calculator.schwab import SchwabEmployeeSponsoredTaxReporter
+from polish_pit_calculator.utils import fetch_exchange_rates
+
+REPORTERS: dict[str, Type[TaxReporter]] = {
+    "schwab": SchwabEmployeeSponsoredTaxReporter,
+    "ib": IBTradeCashTaxReporter,
+    "coinbase": CoinbaseTaxReporter,
+    "revolut": RevolutInterestTaxReporter,
+    "raw": RawTaxReporter,
+}
+
+
+class ServiceBusy(Exception):
+    pass
+
+
+class LatencyMetrics:
+    def __init__(self, window: int = 1000) -> None:
+        self._lock = threading.Lock()
+        self._latencies: dict[str, deque[float]] = defaultdict(
+            lambda: deque(maxlen=window)
+        )
+        self._counts: dict[str, dict[int, int]] = defaultdict(
+            lambda: defaultdict(int)
+        )
+
+    def record(self, endpoint: str, status: int, seconds: float) -> None:
+        with self._lock:
+            self._latencies[endpoint].append(seconds)
+            self._counts[endpoint][status] += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            latencies = {k: np.array(v) for k, v in self._latencies.items()}
+            counts = {k: dict(v) for k, v in self._counts.items()}
+        return {
+            endpoint: {
+                "requests": sum(counts[endpoint].values()),
+                "statuses": counts[endpoint],
+                "mean_ms": 1e3 * x.mean(),
+                **{
+                    f"p{q}_ms": 1e3 * np.percentile(x, q) for q in [50, 95, 99]
+                },
+                "max_ms": 1e3 * x.max(),
+            }
+            for endpoint, x in latencies.items()
+        }
+
+
+class ReportService:
+    def __init__(
+        self,
+        max_workers: int = 4,
+        max_pending: int = 16,
+        cache_size: int = 128,
+        warm_from_year: int | None = None,
+    ) -> None:
+        self.max_pending = max_pending
+        self.cache_size = cache_size
+        self.metrics = LatencyMetrics()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._cache: OrderedDict[str, TaxReport] = OrderedDict()
+        self._lock = threading.Lock()
+        if warm_from_year is not None:
+            self._executor.submit(fetch_exchange_rates, warm_from_year)
+
+    def generate(
+        self, reporter: str, files: list[bytes], **kwargs: Any
+    ) -> TaxReport:
+        if reporter not in REPORTERS:
+            raise KeyError(f"Unknown reporter: {reporter}")
+        key = self._cache_key(reporter, files, kwargs)
+        with self._lock:
+            if key in self._cache:
+                self.cache_hits += 1
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            self.cache_misses += 1
+        if not self._slots.acquire(blocking=False):
+            raise ServiceBusy(
+                f"More than {self.max_pending} reports are pending."
+            )
+        try:
+            tax_reporter = REPORTERS[reporter](
+                *[BytesIO(x) for x in files], **kwargs
+            )
+            tax_report = self._executor.submit(tax_reporter.generate).result()
+        finally:
+            self._slots.release()
+        with self._lock:
+            self._cache[key] = tax_report
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tax_report
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            cache = {
+                "size": len(self._cache),
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+            }
+        return {"cache": cache, "endpoints": self.metrics.snapshot()}
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _cache_key(
+        reporter: str, files: list[bytes], kwargs: dict[str, Any]
+    ) -> str:
+        digest = hashlib.sha256(
+            json.dumps([reporter, kwargs], sort_keys=True).encode()
+        )
+        for content in files:
+            digest.update(hashlib.sha256(content).digest())
+        return digest.hexdigest()
+
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    service: ReportService
+
+    def do_GET(self) -> None:
+        self._handle(self._get)
+
+    def do_POST(self) -> None:
+        self._handle(self._post)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _get(self, path: str) -> tuple[HTTPStatus, Any]:
+        if path == "/health":
+            return HTTPStatus.OK, {"status": "ok"}
+        if path == "/metrics":
+            return HTTPStatus.OK, self.service.stats()
+        return HTTPStatus.NOT_FOUND, {"error": f"Unknown path: {path}"}
+
+    def _post(self, path: str) -> tuple[HTTPStatus, Any]:
+        if path != "/reports":
+            return HTTPStatus.NOT_FOUND, {"error": f"Unknown path: {path}"}
+        try:
+            length = int(self.headers["Content-Length"])
+            body = json.loads(self.rfile.read(length))
+            reporter = body["reporter"]
+            files = [
+                base64.b64decode(x["content"], validate=True)
+                for x in body["files"]
+            ]
+            fixed_point = body.get("fixed_point", False)
+            low_memory = body.get("low_memory", False)
+        except (KeyError, TypeError, ValueError) as e:
+            return HTTPStatus.BAD_REQUEST, {"error": f"Invalid request: {e}"}
+        for name, value in [
+            ("fixed_point", fixed_point),
+            ("low_memory", low_memory),
+        ]:
+            if not isinstance(value, bool):
+                return HTTPStatus.BAD_REQUEST, {
+                    "error": f"{name} must be a boolean"
+                }
+        if reporter not in REPORTERS:
+            return HTTPStatus.BAD_REQUEST, {
+                "error": f"Unknown reporter: {reporter}"
+            }
+        if not files:
+            return HTTPStatus.BAD_REQUEST, {"error": "No files to report on"}
+        try:
+            tax_report = self.service.generate(
+                reporter,
+                files,
+                fixed_point=fixed_point,
+                low_memory=low_memory,
+            )
+        except ServiceBusy as e:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(e)}
+        except Exception as e:
+            return HTTPStatus.UNPROCESSABLE_ENTITY, {"error": str(e)}
+        return HTTPStatus.OK, {
+            str(year): asdict(tax_record)
+            for year, tax_record in sorted(tax_report.items())
+        }
+
+    def _handle(self, handler: Any) -> None:
+        start = time.perf_counter()
+        path = urlparse(self.path).path
+        status, payload = handler(path)
+        content = json.dumps(payload).encode()
+        self.service.metrics.record(
+            f"{self.command} {path}", int(status), time.perf_counter() - start
+        )
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def make_server(
+    host: str, port: int, service: ReportService
+) -> ThreadingHTTPServer:
+    handler = type(
+        "BoundReportRequestHandler",
+        (ReportRequestHandler,),
+        {"service": service},
+    )
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-pending", type=int, default=16)
+    parser.add_argument("--cache-size", type=int, default=128)
+    parser.add_argument(
+        "--warm-from-year", type=int, default=datetime.now().year - 5
+    )
+    args = parser.parse_args()
+    service = ReportService(
+        max_workers=args.workers,
+        max_pending=args.max_pending,
+        cache_size=args.cache_size,
+        warm_from_year=args.warm_from_year,
+    )
+    server = make_server(args.host, args.port, service)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+from polish_pit_calculator.config import TaxRecord
+
+
+def simulate_sales(
+    open_positions: pd.DataFrame,
+    quantities: Any,
+    prices: Any,
+    exchange_rates: Any,
+    tax_record: TaxRecord | None = None,
+    tax_rate: float = 0.19,
+    symbol: str | None = None,
+    pool: str | None = None,
+) -> pd.DataFrame:
+    lots = open_positions
+    if symbol is not None:
+        lots = lots[lots["Symbol"] == symbol]
+    if pool is not None:
+        lots = lots[lots["Type"] == pool]
+    groups = lots[["Symbol", "Type"]].drop_duplicates()
+    if len(groups) > 1:
+        raise ValueError(
+            "Open positions hold several symbols or pools "
+            f"({', '.join(f'{x} {y}' for x, y in groups.to_numpy())}); "
+            "pass symbol and pool."
+        )
+    lots = lots.sort_values("Date", kind="stable")
+    cum_quantity = np.concatenate(
+        [[0.0], lots["Quantity"].cumsum().to_numpy(dtype=float)]
+    )
+    cum_cost = np.concatenate(
+        [[0.0], lots["AmountPLN"].cumsum().to_numpy(dtype=float)]
+    )
+    quantity, price, exchange_rate = np.meshgrid(
+        np.asarray(quantities, dtype=float),
+        np.asarray(prices, dtype=float),
+        np.asarray(exchange_rates, dtype=float),
+        indexing="ij",
+    )
+    if (quantity > cum_quantity[-1]).any():
+        raise ValueError(
+            f"Cannot sell more than {cum_quantity[-1]:,.0f} open shares."
+        )
+    revenue = quantity * price * exchange_rate
+    cost = np.interp(quantity, cum_quantity, cum_cost)
+    tax_record = tax_record or TaxRecord()
+    base = (
+        tax_record.trade_revenue
+        - tax_record.trade_cost
+        - tax_record.trade_loss_from_previous_years
+    )
+    tax = tax_rate * (
+        np.maximum(base + revenue - cost, 0.0) - np.maximum(base, 0.0)
+    )
+    return pd.DataFrame(
+        {
+            "Quantity": quantity.ravel(),
+            "Price": price.ravel(),
+            "ExchangeRate": exchange_rate.ravel(),
+            "Revenue": revenue.ravel(),
+            "Cost": cost.ravel(),
+            "Profit": (revenue - cost).ravel(),
+            "Tax": tax.ravel(),
+        }
+    )
@@ -0,0 +1,310 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+
+from polish_pit_calculator.audit import AUDIT_COLUMNS, LotWriter
+from polish_pit_calculator.config import TaxRecord, TaxReport, TaxReporter
+from polish_pit_calculator.ledger import LEDGER_COLUMNS
+
+TAX_RECORD_FIELDS = list(TaxRecord.__dataclass_fields__)
+
+SQL_TYPES = {
+    "string": "TEXT",
+    "datetime64[s]": "TEXT",
+    "datetime64[ns]": "TEXT",
+    "float64": "REAL",
+}
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS files (
+    taxpayer TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    reporter TEXT NOT NULL,
+    names TEXT NOT NULL,
+    PRIMARY KEY (taxpayer, file_hash)
+);
+CREATE TABLE IF NOT EXISTS tax_records (
+    taxpayer TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    {", ".join(f"{x} REAL NOT NULL" for x in TAX_RECORD_FIELDS)},
+    PRIMARY KEY (taxpayer, file_hash, year)
+);
+CREATE INDEX IF NOT EXISTS tax_records_year
+    ON tax_records (taxpayer, year);
+CREATE TABLE IF NOT EXISTS transactions (
+    taxpayer TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    section TEXT NOT NULL,
+    year INTEGER,
+    symbol TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_file
+    ON transactions (taxpayer, file_hash);
+CREATE INDEX IF NOT EXISTS transactions_year
+    ON transactions (taxpayer, year);
+CREATE INDEX IF NOT EXISTS transactions_symbol
+    ON transactions (taxpayer, symbol);
+CREATE TABLE IF NOT EXISTS ledger (
+    taxpayer TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    Year INTEGER NOT NULL,
+    {", ".join(f"{k} {SQL_TYPES[v]}" for k, v in LEDGER_COLUMNS.items())},
+    ExchangeRate REAL,
+    ExchangeRateDate TEXT
+);
+CREATE INDEX IF NOT EXISTS ledger_file ON ledger (taxpayer, file_hash);
+CREATE INDEX IF NOT EXISTS ledger_year ON ledger (taxpayer, Year);
+CREATE INDEX IF NOT EXISTS ledger_symbol ON ledger (taxpayer, Symbol);
+CREATE TABLE IF NOT EXISTS lots (
+    taxpayer TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    Year INTEGER NOT NULL,
+    {", ".join(f"{k} {SQL_TYPES[v]}" for k, v in AUDIT_COLUMNS.items())}
+);
+CREATE INDEX IF NOT EXISTS lots_file ON lots (taxpayer, file_hash);
+CREATE INDEX IF NOT EXISTS lots_year ON lots (taxpayer, Year);
+CREATE INDEX IF NOT EXISTS lots_symbol ON lots (taxpayer, Symbol);
+"""
+
+
+class TaxStore:
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path).expanduser()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.executescript(SCHEMA)
+
+    @staticmethod
+    def hash_files(*files: Any) -> str:
+        digest = hashlib.sha256()
+        for f in files:
+            if hasattr(f, "sha256"):
+                digest.update(bytes.fromhex(f.sha256))
+                continue
+            if hasattr(f, "getvalue"):
+                content = f.getvalue()
+            else:
+                content = Path(f).read_bytes()
+            digest.update(hashlib.sha256(content).digest())
+        return digest.hexdigest()
+
+    @staticmethod
+    def report_hash(tax_reporter: TaxReporter, *files: Any) -> str:
+        digest = hashlib.sha256(
+            json.dumps(
+                [type(tax_reporter).__name__, tax_reporter.options],
+                sort_keys=True,
+            ).encode()
+        )
+        digest.update(bytes.fromhex(TaxStore.hash_files(*files)))
+        return digest.hexdigest()
+
+    def lot_writer(self, taxpayer: str, file_hash: str) -> "SqliteLotWriter":
+        return SqliteLotWriter(self, taxpayer, file_hash)
+
+    def save(
+        self,
+        taxpayer: str,
+        file_hash: str,
+        tax_reporter: TaxReporter,
+        tax_report: TaxReport,
+        names: list[str],
+    ) -> None:
+        key = (taxpayer, file_hash)
+        tax_records = [
+            (*key, year, *(getattr(tax_record, x) for x in TAX_RECORD_FIELDS))
+            for year, tax_record in tax_report.items()
+        ]
+        transactions = [
+            (*key, section, *row)
+            for section, df in tax_reporter.transactions_.items()
+            for row in zip(
+                *self._transaction_keys(tax_reporter, df),
+                df.to_json(
+                    orient="records", lines=True, date_format="iso"
+                ).splitlines(),
+            )
+        ]
+        ledger = getattr(tax_reporter, "ledger_", None)
+        if ledger is not None:
+            ledger = ledger.assign(
+                taxpayer=taxpayer,
+                file_hash=file_hash,
+                Year=ledger["Date"].dt.year,
+                Date=ledger["Date"].dt.strftime("%Y-%m-%d %H:%M:%S"),
+                ExchangeRateDate=ledger["ExchangeRateDate"].dt.strftime(
+                    "%Y-%m-%d"
+                ),
+            )[["taxpayer", "file_hash", "Year", *ledger.columns]]
+        with self._lock, self._connection:
+            for table in ["files", "tax_records", "transactions", "ledger"]:
+                self._connection.execute(
+                    f"DELETE FROM {table} WHERE taxpayer = ? AND file_hash = ?",
+                    key,
+                )
+            self._connection.execute(
+                "INSERT INTO files VALUES (?, ?, ?, ?)",
+                (*key, type(tax_reporter).__name__, "\n".join(names)),
+            )
+            self._connection.executemany(
+                f"INSERT INTO tax_records VALUES "
+                f"({', '.join('?' * (len(TAX_RECORD_FIELDS) + 3))})",
+                tax_records,
+            )
+            self._connection.executemany(
+                "INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    tuple(None if pd.isna(x) else x for x in row)
+                    for row in transactions
+                ],
+            )
+            if ledger is not None:
+                ledger.to_sql(
+                    "ledger", self._connection, if_exists="append", index=False
+                )
+
+    def load_tax_report(
+        self, taxpayer: str, *file_hashes: str
+    ) -> TaxReport | None:
+        query = "WHERE taxpayer = ?"
+        params: list[Any] = [taxpayer]
+        if file_hashes:
+            query += f" AND file_hash IN ({', '.join('?' * len(file_hashes))})"
+            params.extend(file_hashes)
+        files = self._read(
+            f"SELECT rowid AS saved, file_hash, reporter FROM files {query}",
+            params,
+        )
+        if files.empty:
+            return None
+        df = self._read(f"SELECT * FROM tax_records {query}", params).merge(
+            files, on="file_hash"
+        )
+        if not file_hashes:
+            df = df.sort_values("saved").drop_duplicates(
+                ["reporter", "year"], keep="last"
+            )
+        df = (
+            df.drop(columns=["taxpayer", "file_hash", "saved", "reporter"])
+            .groupby("year")
+            .sum()
+        )
+        return TaxReport(
+            {
+                int(year): TaxRecord(**tax_record)
+                for year, tax_record in df.iterrows()
+            }
+        )
+
+    def load_files(self, taxpayer: str) -> pd.DataFrame:
+        return self._read(
+            "SELECT file_hash, reporter, names FROM files WHERE taxpayer = ? "
+            "ORDER BY rowid",
+            [taxpayer],
+        )
+
+    def load_transactions(
+        self,
+        taxpayer: str,
+        year: int | None = None,
+        symbol: str | None = None,
+    ) -> pd.DataFrame:
+        return self._select("transactions", "year", taxpayer, year, symbol)
+
+    def load_ledger(
+        self,
+        taxpayer: str,
+        year: int | None = None,
+        symbol: str | None = None,
+    ) -> pd.DataFrame:
+        return self._select("ledger", "Year", taxpayer, year, symbol)
+
+    def load_lots(
+        self,
+        taxpayer: str,
+        year: int | None = None,
+        symbol: str | None = None,
+    ) -> pd.DataFrame:
+        return self._select("lots", "Year", taxpayer, year, symbol)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    @staticmethod
+    def _transaction_keys(
+        tax_reporter: TaxReporter, df: pd.DataFrame
+    ) -> tuple[list[Any], list[Any]]:
+        missing = pd.Series(pd.NA, index=df.index)
+        year = next(
+            (df[x] for x in tax_reporter.year_columns if x in df), missing
+        )
+        if not pd.api.types.is_integer_dtype(year):
+            year = pd.to_datetime(year).dt.year
+        symbol = next(
+            (df[x] for x in tax_reporter.symbol_columns if x in df), missing
+        )
+        return year.astype("Int64").tolist(), symbol.astype("string").tolist()
+
+    def _select(
+        self,
+        table: str,
+        year_col: str,
+        taxpayer: str,
+        year: int | None,
+        symbol: str | None,
+    ) -> pd.DataFrame:
+        query = f"SELECT * FROM {table} WHERE taxpayer = ?"
+        params: list[Any] = [taxpayer]
+        if year is not None:
+            query += f" AND {year_col} = ?"
+            params.append(year)
+        if symbol is not None:
+            query += " AND symbol = ?"
+            params.append(symbol)
+        return self._read(query, params)
+
+    def _read(self, query: str, params: list[Any]) -> pd.DataFrame:
+        with self._lock:
+            return pd.read_sql_query(query, self._connection, params=params)
+
+
+class SqliteLotWriter(LotWriter):
+    def __init__(
+        self,
+        store: TaxStore,
+        taxpayer: str,
+        file_hash: str,
+        batch_size: int = 10_000,
+    ) -> None:
+        super().__init__(batch_size)
+        self.store = store
+        self.taxpayer = taxpayer
+        self.file_hash = file_hash
+        with store._lock, store._connection:
+            store._connection.execute(
+                "DELETE FROM lots WHERE taxpayer = ? AND file_hash = ?",
+                (taxpayer, file_hash),
+            )
+
+    def _write_batch(self, df: pd.DataFrame) -> None:
+        df = df.assign(
+            taxpayer=self.taxpayer,
+            file_hash=self.file_hash,
+            Year=df["SellDate"].dt.year,
+        )[["taxpayer", "file_hash", "Year", *AUDIT_COLUMNS]]
+        for col, dtype in AUDIT_COLUMNS.items():
+            if dtype.startswith("datetime"):
+                df[col] = df[col].dt.strftime("%Y-%m-%d")
+        with self.store._lock, self.store._connection:
+            df.to_sql(
+                "lots", self.store._connection, if_exists="append", index=False
+            )
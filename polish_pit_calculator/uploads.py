@@ -0,0 +1,165 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+from polish_pit_calculator.utils import open_binary
+
+CHUNK_SIZE = 1 << 20
+PARTIAL_SUFFIX = ".part"
+
+
+@dataclass(frozen=True)
+class StoredFile(os.PathLike):
+    name: str
+    path: Path
+    sha256: str
+    size: int
+
+    def __fspath__(self) -> str:
+        return str(self.path)
+
+
+@dataclass
+class UploadSession:
+    files: Counter[str] = field(default_factory=Counter)
+    last_used: datetime = field(default_factory=datetime.now)
+
+
+class UploadStore:
+    def __init__(
+        self,
+        root: str | Path | None = None,
+        max_session_bytes: int = 256 * 2**20,
+        max_total_bytes: int = 2 * 2**30,
+        ttl: timedelta = timedelta(hours=2),
+    ) -> None:
+        if root is None:
+            root = tempfile.mkdtemp(prefix="polish_pit_calculator_")
+            weakref.finalize(self, shutil.rmtree, root, ignore_errors=True)
+        self.root = Path(root).expanduser()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_session_bytes = max_session_bytes
+        self.max_total_bytes = max_total_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sessions: dict[str, UploadSession] = {}
+        self._sizes: dict[str, int] = {}
+        self._pinned: Counter[str] = Counter()
+
+    def put(self, session_id: str, *files: Any) -> list[StoredFile]:
+        spooled: list[tuple[Path, str, int]] = []
+        try:
+            for f in files:
+                spooled.append(self._spool(f))
+            with self._lock:
+                session = self._sessions.get(session_id, UploadSession())
+                sizes = {x: self._sizes[x] for x in session.files}
+                sizes |= {sha256: size for _, sha256, size in spooled}
+                self._check_session_bytes(sum(sizes.values()))
+                self._sessions[session_id] = session
+                stored = []
+                for f, (tmp, sha256, size) in zip(files, spooled):
+                    path = self.root / sha256
+                    if sha256 in self._sizes and path.exists():
+                        tmp.unlink()
+                    else:
+                        os.replace(tmp, path)
+                    self._sizes[sha256] = size
+                    session.files[sha256] += 1
+                    name = getattr(f, "name", None) or Path(f).name
+                    stored.append(StoredFile(name, path, sha256, size))
+                session.last_used = datetime.now()
+                self._evict(session_id)
+                return stored
+        finally:
+            for tmp, _, _ in spooled:
+                tmp.unlink(missing_ok=True)
+
+    def touch(self, session_id: str, *files: StoredFile) -> bool:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = datetime.now()
+            self._evict(session_id)
+            held = session.files if session is not None else Counter()
+            return all(held[x.sha256] > 0 for x in files)
+
+    def pin(self, *files: StoredFile) -> None:
+        with self._lock:
+            self._pinned.update(x.sha256 for x in files)
+
+    def unpin(self, *files: StoredFile) -> None:
+        with self._lock:
+            self._pinned.subtract(x.sha256 for x in files)
+            self._pinned = +self._pinned
+            self._collect()
+
+    def release(self, session_id: str, *files: StoredFile) -> None:
+        with self._lock:
+            if (session := self._sessions.get(session_id)) is None:
+                return
+            if files:
+                session.files.subtract(x.sha256 for x in files)
+                session.files = +session.files
+            else:
+                session.files.clear()
+            if not session.files:
+                del self._sessions[session_id]
+            self._collect()
+
+    def _spool(self, arg: Any) -> tuple[Path, str, int]:
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(suffix=PARTIAL_SUFFIX, dir=self.root)
+        try:
+            with open_binary(arg) as src, os.fdopen(fd, "wb") as dst:
+                while chunk := src.read(CHUNK_SIZE):
+                    digest.update(chunk)
+                    dst.write(chunk)
+                    size += len(chunk)
+                    self._check_session_bytes(size)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        return Path(tmp), digest.hexdigest(), size
+
+    def _check_session_bytes(self, size: int) -> None:
+        if size > self.max_session_bytes:
+            raise ValueError(
+                "Uploaded files exceed the limit of "
+                f"{self.max_session_bytes / 2**20:.0f} MB per session."
+            )
+
+    def _evict(self, current: str) -> None:
+        now = datetime.now()
+        for session_id, session in list(self._sessions.items()):
+            if session_id != current and now - session.last_used > self.ttl:
+                del self._sessions[session_id]
+        lru = sorted(
+            (x for x in self._sessions if x != current),
+            key=lambda x: self._sessions[x].last_used,
+        )
+        while lru and self._referenced_bytes() > self.max_total_bytes:
+            del self._sessions[lru.pop(0)]
+        self._collect()
+
+    def _referenced(self) -> set[str]:
+        return {x for y in self._sessions.values() for x in y.files}
+
+    def _referenced_bytes(self) -> int:
+        return sum(self._sizes[x] for x in self._referenced())
+
+    def _collect(self) -> None:
+        referenced = self._referenced()
+        for sha256 in list(self._sizes):
+            if sha256 not in referenced and sha256 not in self._pinned:
+                (self.root / sha256).unlink(missing_ok=True)
+                del self._sizes[sha256]
@@ -1,43 +1,129 @@
-from datetime import date, datetime
+import json
+import re
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from io import StringIO
+from pathlib import Path
+from typing import IO, Any, Iterator
+from urllib.request import urlopen
 
+import numpy as np
 import pandas as pd
 
+NBP_ARCHIVE_URL = (
+    "https://static.nbp.pl/dane/kursy/Archiwum/archiwum_tab_a_{year}.csv"
+)
+NBP_RATE_COLUMN = r"\d+[A-Z]{3}"
+NBP_DATE = r"\d{8};"
 
-def _try_to_cast_string_to_float(x) -> float | None:
-    try:
-        assert "," in x
-        return float(x.replace(",", "."))
-    except (AttributeError, ValueError, AssertionError, TypeError):
-        return None
 
+def parse_exchange_rates_archive(content: bytes) -> pd.DataFrame:
+    lines = content.decode("iso-8859-2").splitlines(True)
+    columns = [
+        x for x in lines[0].split(";") if re.fullmatch(NBP_RATE_COLUMN, x)
+    ]
+    rows = [x for x in lines[2:] if re.match(NBP_DATE, x)]
+    df = pd.read_csv(
+        StringIO(lines[0] + "".join(rows)),
+        delimiter=";",
+        decimal=",",
+        index_col="data",
+        usecols=["data", *columns],
+        dtype={"data": "string", **dict.fromkeys(columns, "float64")},
+    ).dropna(axis=1, how="all")
+    df.index = pd.to_datetime(df.index, format="%Y%m%d").date
+    df.columns = [f"_{x}" for x in df.columns]
+    return df
 
-def fetch_exchange_rates(min_year: int) -> dict[str, dict[date, float]]:
-    df_list: list[pd.DataFrame] = []
-    for year in range(min_year, datetime.now().year + 1):
-        df = (
-            pd.read_csv(
-                f"https://static.nbp.pl/dane/kursy/Archiwum/archiwum_tab_a_{year}.csv",
-                delimiter=";",
-                encoding="iso-8859-2",
-                header=0,
-                skiprows=[1],
-            )
-            .set_index("data")
-            .map(_try_to_cast_string_to_float)
-            .dropna(axis=1, how="all")
-            .dropna(axis=0, how="all")
-            .astype(float)
-            .rename_axis(index="Date")
+
+def _fetch_exchange_rates_archive(year: int) -> pd.DataFrame:
+    with urlopen(NBP_ARCHIVE_URL.format(year=year)) as response:
+        return parse_exchange_rates_archive(response.read())
+
+
+class ExchangeRateTable:
+    def __init__(
+        self, refresh_interval: timedelta = timedelta(hours=1)
+    ) -> None:
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._archives: dict[int, tuple[datetime, pd.DataFrame]] = {}
+        self._pending: dict[int, Future[pd.DataFrame]] = {}
+        self._tables: dict[
+            int, tuple[list[pd.DataFrame], dict[str, dict[date, float]]]
+        ] = {}
+
+    def archive(self, year: int) -> pd.DataFrame:
+        with self._lock:
+            if year in self._archives:
+                fetched_at, df = self._archives[year]
+                if (
+                    fetched_at.year <= year
+                    and datetime.now() - fetched_at >= self.refresh_interval
+                    and year not in self._pending
+                ):
+                    future = self._pending[year] = Future()
+                    threading.Thread(
+                        target=self._load, args=(year, future), daemon=True
+                    ).start()
+                return df
+            loading = year not in self._pending
+            if loading:
+                self._pending[year] = Future()
+            future = self._pending[year]
+        if loading:
+            self._load(year, future)
+        return future.result()
+
+    def exchange_rates(self, min_year: int) -> dict[str, dict[date, float]]:
+        df_list = [
+            self.archive(year)
+            for year in range(min_year - 1, datetime.now().year + 1)
+        ]
+        with self._lock:
+            cached = self._tables.get(min_year)
+        if cached is not None and self._is_current(cached[0], df_list):
+            return cached[1]
+        exchange_rates_df = pd.concat(df_list).sort_index()
+        exchange_rates = {
+            "USD": exchange_rates_df["_1USD"].to_dict(),
+            "EUR": exchange_rates_df["_1EUR"].to_dict(),
+        }
+        with self._lock:
+            cached = self._tables.get(min_year)
+            if cached is None or not self._is_current(cached[0], df_list):
+                self._tables[min_year] = (df_list, exchange_rates)
+            return self._tables[min_year][1]
+
+    @staticmethod
+    def _is_current(
+        cached_list: list[pd.DataFrame], df_list: list[pd.DataFrame]
+    ) -> bool:
+        return len(cached_list) == len(df_list) and all(
+            x is y for x, y in zip(cached_list, df_list)
         )
-        df.index = pd.to_datetime(df.index).date
-        df.columns = [f"_{x}" if x[0].isdigit() else x for x in df.columns]
-        df_list.append(df)
-    exchange_rates_df = pd.concat(df_list).sort_index().shift()
-    exchange_rates = {
-        "USD": exchange_rates_df["_1USD"].to_dict(),
-        "EUR": exchange_rates_df["_1EUR"].to_dict(),
-    }
-    return exchange_rates
+
+    def _load(self, year: int, future: Future[pd.DataFrame]) -> None:
+        try:
+            df = _fetch_exchange_rates_archive(year)
+        except BaseException as e:
+            with self._lock:
+                del self._pending[year]
+            future.set_exception(e)
+        else:
+            with self._lock:
+                self._archives[year] = (datetime.now(), df)
+                del self._pending[year]
+            future.set_result(df)
+
+
+EXCHANGE_RATE_TABLE = ExchangeRateTable()
+
+
+def fetch_exchange_rates(min_year: int) -> dict[str, dict[date, float]]:
+    return EXCHANGE_RATE_TABLE.exchange_rates(min_year)
 
 
 def get_exchange_rate(
@@ -46,7 +132,159 @@ def get_exchange_rate(
     exchange_rates: dict[str, dict[date, float]],
 ) -> float:
     exchange_rates_currency = exchange_rates[currency]
-    if date_ in exchange_rates_currency:
-        return exchange_rates_currency[date_]
-    date_ = sorted(filter(lambda x: x < date_, exchange_rates_currency))[-1]
+    date_ = max(filter(lambda x: x < date_, exchange_rates_currency))
     return exchange_rates_currency[date_]
+
+
+def get_exchange_rates(
+    currencies: Any,
+    dates: Any,
+    exchange_rates: dict[str, dict[date, float]],
+) -> tuple[np.ndarray, np.ndarray]:
+    currencies = np.asarray(currencies, dtype=object)
+    dates = (
+        pd.DatetimeIndex(dates).normalize().to_numpy(dtype="datetime64[ns]")
+    )
+    rates = np.ones(len(dates))
+    rate_dates = np.full(len(dates), np.datetime64("NaT"), "datetime64[ns]")
+    for currency in pd.unique(currencies[currencies != "PLN"]):
+        table = pd.Series(exchange_rates[currency]).sort_index()
+        keys = pd.to_datetime(table.index).to_numpy(dtype="datetime64[ns]")
+        mask = currencies == currency
+        pos = np.searchsorted(keys, dates[mask], side="left") - 1
+        if (pos < 0).any():
+            raise ValueError(
+                f"No {currency} exchange rate before "
+                f"{dates[mask][pos < 0].min()}."
+            )
+        rates[mask] = table.to_numpy()[pos]
+        rate_dates[mask] = keys[pos]
+    return rates, rate_dates
+
+
+MONEY_SCALE = 100
+RATE_SCALE = 10_000
+
+
+def to_minor_units(amount: Any) -> np.ndarray:
+    amount = np.round(np.asarray(amount, dtype=float), 6)
+    return np.round(amount * MONEY_SCALE).astype(np.int64)
+
+
+def to_scaled_rates(rate: Any) -> np.ndarray:
+    return np.round(np.asarray(rate, dtype=float) * RATE_SCALE).astype(
+        np.int64
+    )
+
+
+def convert_minor_units(amount: Any, rate: Any) -> np.ndarray:
+    product = np.asarray(amount, dtype=np.int64) * np.asarray(
+        rate, dtype=np.int64
+    )
+    return np.sign(product) * (
+        (np.abs(product) + RATE_SCALE // 2) // RATE_SCALE
+    )
+
+
+FINGERPRINT_MULTIPLIER = np.uint64(1_000_003)
+
+
+def fingerprint_rows(
+    df: pd.DataFrame, columns: list[str] | None = None
+) -> np.ndarray:
+    fingerprints = np.zeros(len(df), dtype=np.uint64)
+    for col in columns if columns is not None else df.columns:
+        codes, uniques = pd.factorize(df[col], use_na_sentinel=False)
+        hashes = pd.util.hash_pandas_object(
+            pd.Series(uniques).astype("string").fillna("").str.strip(),
+            index=False,
+        ).to_numpy()
+        fingerprints = fingerprints * FINGERPRINT_MULTIPLIER ^ hashes[codes]
+    return fingerprints
+
+
+def fingerprint_blocks(
+    fingerprints: np.ndarray, blocks: np.ndarray
+) -> np.ndarray:
+    position = pd.Series(blocks).groupby(blocks).cumcount().to_numpy()
+    hashes = pd.util.hash_pandas_object(
+        pd.DataFrame({"fingerprint": fingerprints, "position": position}),
+        index=False,
+    )
+    return hashes.groupby(blocks).transform("sum").to_numpy()
+
+
+def find_duplicates(
+    fingerprints: np.ndarray, sources: np.ndarray
+) -> np.ndarray:
+    occurrence = (
+        pd.Series(fingerprints).groupby([sources, fingerprints]).cumcount()
+    )
+    return (
+        pd.DataFrame(
+            {"fingerprint": fingerprints, "occurrence": occurrence.to_numpy()}
+        )
+        .duplicated()
+        .to_numpy()
+    )
+
+
+def iter_json_array(
+    fp: IO[str], key: str, chunk_size: int = 1 << 16
+) -> Iterator[Any]:
+    decoder = json.JSONDecoder()
+    pattern = re.compile(rf'"{re.escape(key)}"\s*:\s*\[')
+    buffer = ""
+    while (match := pattern.search(buffer)) is None:
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            raise ValueError(f"No {key} array found.")
+        buffer = buffer[-256:] + chunk
+    buffer, pos = buffer[match.end() :], 0
+    eof = False
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+            while end < len(buffer) and buffer[end] in " \t\r\n":
+                end += 1
+            if end == len(buffer) or buffer[end] not in ",]":
+                raise json.JSONDecodeError(
+                    "Expecting ',' delimiter", buffer, end
+                )
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = fp.read(chunk_size)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        pos = end
+        yield item
+
+
+@contextmanager
+def open_binary(arg: Any) -> Iterator[IO[bytes]]:
+    if hasattr(arg, "read"):
+        arg.seek(0)
+        yield arg
+    else:
+        with Path(arg).open("rb") as fp:
+            yield fp
+
+
+def peek(fp: IO[bytes], size: int = 1024) -> bytes:
+    head = fp.read(size)
+    fp.seek(0)
+    return head.lstrip(b"\xef\xbb\xbf \t\r\n")
+
+
+def is_json(fp: IO[bytes]) -> bool:
+    return peek(fp)[:1] in (b"{", b"[")
+
+
+def is_xml(fp: IO[bytes]) -> bool:
+    return peek(fp)[:1] == b"<"
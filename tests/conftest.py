@@ -0,0 +1,27 @@
+import math
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+
+DATA = Path(__file__).parent / "data"
+
+
+def fake_exchange_rates(min_year: int) -> dict[str, dict[date, float]]:
+    rates: dict[str, dict[date, float]] = {"USD": {}, "EUR": {}}
+    day = date(min_year - 1, 12, 1)
+    while day.year <= date.today().year:
+        if day.weekday() < 5:
+            x = day.toordinal()
+            rates["USD"][day] = round(3.8 + 0.3 * math.sin(x / 37), 4)
+            rates["EUR"][day] = round(4.3 + 0.2 * math.cos(x / 41), 4)
+        day += timedelta(days=1)
+    return rates
+
+
+@pytest.fixture(autouse=True)
+def exchange_rates(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(
+        "polish_pit_calculator.ledger.fetch_exchange_rates",
+        fake_exchange_rates,
+    )
@@ -0,0 +1,56 @@
+from io import BytesIO
+
+import pytest
+from conftest import DATA
+
+from polish_pit_calculator.coinbase import CoinbaseTaxReporter
+from polish_pit_calculator.detect import (
+    detect_tax_reporter,
+    group_by_tax_reporter,
+)
+from polish_pit_calculator.ib import IBTradeCashTaxReporter
+from polish_pit_calculator.raw import RawTaxReporter
+from polish_pit_calculator.revolut import RevolutInterestTaxReporter
+from polish_pit_calculator.schwab import SchwabEmployeeSponsoredTaxReporter
+
+RAW = b"year,description,foreign_interest\n2023,Bank,12.5\n"
+UNKNOWN = b"Date,Ticker,Shares,Price\n2023-01-05,XYZ,1,10.0\n"
+
+FORMATS = [
+    (SchwabEmployeeSponsoredTaxReporter, "schwab.csv"),
+    (SchwabEmployeeSponsoredTaxReporter, "schwab.json"),
+    (IBTradeCashTaxReporter, "ib.csv"),
+    (IBTradeCashTaxReporter, "ib.xml"),
+    (CoinbaseTaxReporter, "coinbase.csv"),
+    (RevolutInterestTaxReporter, "revolut.csv"),
+]
+
+
+@pytest.mark.parametrize("tax_reporter_cls, name", FORMATS)
+def test_detect_tax_reporter(tax_reporter_cls, name):
+    assert detect_tax_reporter(DATA / name) is tax_reporter_cls
+    content = b"\xef\xbb\xbf" + (DATA / name).read_bytes()
+    assert detect_tax_reporter(BytesIO(content)) is tax_reporter_cls
+
+
+def test_detect_raw_and_unknown():
+    assert detect_tax_reporter(BytesIO(RAW)) is RawTaxReporter
+    assert detect_tax_reporter(BytesIO(UNKNOWN)) is None
+    assert detect_tax_reporter(BytesIO(b"")) is None
+
+
+def test_group_by_tax_reporter():
+    raw = BytesIO(RAW)
+    files = [DATA / name for _, name in FORMATS]
+    groups = group_by_tax_reporter(*files, raw)
+    assert groups == {
+        SchwabEmployeeSponsoredTaxReporter: files[:2],
+        IBTradeCashTaxReporter: files[2:4],
+        CoinbaseTaxReporter: files[4:5],
+        RevolutInterestTaxReporter: files[5:],
+        RawTaxReporter: [raw],
+    }
+    unknown = BytesIO(UNKNOWN)
+    unknown.name = "export.csv"
+    with pytest.raises(ValueError, match="export.csv"):
+        group_by_tax_reporter(files[0], unknown)
@@ -0,0 +1,111 @@
+from io import BytesIO
+
+import pandas as pd
+import pytest
+from conftest import DATA
+
+from polish_pit_calculator.ib import IBTradeCashTaxReporter
+
+STATEMENT = b"""Statement,Header,Field Name,Field Value
+Statement,Data,Title,Activity Statement
+"""
+
+
+@pytest.mark.parametrize("low_memory", [False, True])
+def test_missing_payment_sections(low_memory):
+    tax_reporter = IBTradeCashTaxReporter(
+        DATA / "ib_withholding_only.csv", low_memory=low_memory
+    )
+    tax_report = tax_reporter.generate()
+    assert [year for year, _ in tax_report.items()] == [2023]
+    assert tax_report[2023].trade_revenue > 0
+    assert tax_reporter.transactions_["Dividends"].empty
+    assert tax_reporter.transactions_["Interest"].empty
+
+
+@pytest.mark.parametrize("low_memory", [False, True])
+def test_missing_all_sections(low_memory):
+    tax_reporter = IBTradeCashTaxReporter(
+        BytesIO(STATEMENT), low_memory=low_memory
+    )
+    assert not tax_reporter.generate().items()
+
+
+DIVIDENDS = b"""Dividends,Header,Currency,Date,Description,Amount
+Dividends,Data,USD,2023-03-15,AAPL(US0378331005) Cash Dividend USD 0.24 per Share (Ordinary Dividend),240
+Dividends,Data,USD,2023-03-17,AAPL(US0378331005) Cash Dividend USD 0.24 per Share (Ordinary Dividend),24
+Withholding Tax,Header,Currency,Date,Description,Amount,Code
+Withholding Tax,Data,USD,2023-03-16,AAPL(US0378331005) Cash Dividend USD 0.24 per Share - US Tax,-36,
+Withholding Tax,Data,USD,2023-06-01,AAPL(US0378331005) Cash Dividend USD 0.24 per Share - US Tax,-3.6,
+Withholding Tax,Data,USD,2023-06-01,Withholding @ 20% on Credit Interest for May-2023,-1,
+"""
+
+
+@pytest.mark.parametrize("low_memory", [False, True])
+def test_withholding_matched_once(low_memory):
+    tax_reporter = IBTradeCashTaxReporter(
+        BytesIO(STATEMENT + DIVIDENDS), low_memory=low_memory
+    )
+    tax_reporter.generate()
+    dividends = tax_reporter.transactions_["Dividends"]
+    assert dividends["Amount_wtax"].tolist() == [36.0, 0.0]
+    ledger = tax_reporter.ledger_
+    withholding = ledger[ledger["Kind"] == "Withholding"]
+    assert withholding["Amount"].sum() == pytest.approx(40.6)
+    assert len(withholding) == 3
+    wtax = tax_reporter.transactions_["Withholding Tax"]
+    assert wtax["Matched"].tolist() == [True, False, False]
+
+
+@pytest.mark.parametrize("low_memory", [False, True])
+def test_flex_matches_csv(low_memory):
+    csv = IBTradeCashTaxReporter(DATA / "ib.csv", low_memory=low_memory)
+    flex = IBTradeCashTaxReporter(DATA / "ib.xml", low_memory=low_memory)
+    expected = csv.generate().to_dataframe()
+    pd.testing.assert_frame_equal(flex.generate().to_dataframe(), expected)
+    both = IBTradeCashTaxReporter(
+        DATA / "ib.csv", DATA / "ib.xml", low_memory=low_memory
+    )
+    pd.testing.assert_frame_equal(both.generate().to_dataframe(), expected)
+    assert both.duplicate_rows_ == {
+        "Trades": 2,
+        "Dividends": 1,
+        "Interest": 1,
+        "Withholding Tax": 2,
+    }
+
+
+TRADES = [
+    "Trades,Header,DataDiscriminator,Asset Category,Currency,Symbol,"
+    "Date/Time,Quantity,T. Price,C. Price,Proceeds,Comm/Fee,Basis,"
+    "Realized P/L,MTM P/L,Code",
+    'Trades,Data,Order,Stocks,USD,MSFT,"2022-02-01, 10:00:00",100,10,10,'
+    "-1000,-1,0,0,0,O",
+    'Trades,Data,Order,Stocks,USD,MSFT,"2023-01-10, 10:00:00",10,12,12,'
+    "-120,-1,0,0,0,O",
+    'Trades,Data,Order,Stocks,USD,MSFT,"2023-01-10, 10:00:00",10,12,12,'
+    "-120,-1,0,0,0,O",
+    'Trades,Data,Order,Stocks,USD,MSFT,"2023-02-01, 10:00:00",-50,13,13,'
+    "650,-1,0,0,0,C",
+    'Trades,Data,Order,Stocks,USD,MSFT,"2023-06-01, 10:00:00",-70,14,14,'
+    "980,-1,0,0,0,C",
+]
+
+
+def statement(*rows):
+    return BytesIO(STATEMENT + "\n".join([TRADES[0], *rows, ""]).encode())
+
+
+@pytest.mark.parametrize("low_memory", [False, True])
+def test_overlapping_statements(low_memory):
+    full = IBTradeCashTaxReporter(statement(*TRADES[1:]))
+    expected = full.generate().to_dataframe()
+    overlapping = IBTradeCashTaxReporter(
+        statement(*TRADES[1:4]),
+        statement(*TRADES[2:]),
+        low_memory=low_memory,
+    )
+    tax_report = overlapping.generate()
+    pd.testing.assert_frame_equal(tax_report.to_dataframe(), expected)
+    assert overlapping.duplicate_rows_["Trades"] == 2
+    assert overlapping.open_positions_.empty
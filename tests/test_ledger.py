@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+
+from polish_pit_calculator.ledger import LedgerTaxReporter
+
+
+class FrameTaxReporter(LedgerTaxReporter):
+    def _load_ledger(self) -> pd.DataFrame:
+        return self.args[0].copy()
+
+
+def trades(*rows):
+    return pd.DataFrame(
+        rows, columns=["Date", "Kind", "Symbol", "Quantity", "Amount"]
+    ).assign(Date=lambda x: pd.to_datetime(x["Date"]), Currency="USD")
+
+
+UNEVEN = trades(
+    ("2023-01-03", "Buy", "XYZ", 3, 100.0),
+    ("2023-02-01", "Sell", "XYZ", 1, 40.0),
+    ("2023-03-01", "Sell", "XYZ", 1, 40.0),
+    ("2024-03-01", "Sell", "XYZ", 1, 40.0),
+    ("2024-04-02", "Buy", "XYZ", 3, 100.0),
+    ("2024-05-02", "Sell", "XYZ", 1, 40.0),
+)
+
+
+def test_fixed_point_converts_each_transaction_once():
+    floating = FrameTaxReporter(UNEVEN).generate()
+    tax_reporter = FrameTaxReporter(UNEVEN, fixed_point=True)
+    fixed = tax_reporter.generate()
+    ledger = tax_reporter.ledger_
+    buys = ledger[ledger["Kind"] == "Buy"]
+    cost = (buys["Amount"] * buys["ExchangeRate"]).round(2).sum()
+    open_cost = tax_reporter.open_positions_["AmountPLN"].sum()
+    assert fixed[2023].trade_cost + fixed[2024].trade_cost + open_cost == (
+        pytest.approx(cost, abs=1e-9)
+    )
+    sells = ledger[ledger["Kind"] == "Sell"]
+    revenue = (sells["Amount"] * sells["ExchangeRate"]).round(2)
+    for year in [2023, 2024]:
+        assert fixed[year].trade_revenue == pytest.approx(
+            revenue[sells["Date"].dt.year == year].sum(), abs=1e-9
+        )
+        assert fixed[year].trade_cost == pytest.approx(
+            floating[year].trade_cost, abs=0.01
+        )
+
+
+class ShortTaxReporter(FrameTaxReporter):
+    allow_unmatched_sales = True
+
+
+SHORT = trades(
+    ("2022-06-01", "Sell", "TSLA", 2, 999.0),
+    ("2023-02-01", "Buy", "TSLA", 3, 1200.0),
+)
+
+
+def test_short_sale_is_covered_by_a_later_purchase():
+    tax_reporter = ShortTaxReporter(SHORT)
+    tax_report = tax_reporter.generate()
+    sale, purchase = tax_reporter.ledger_.itertuples()
+    assert tax_report[2023].trade_revenue == pytest.approx(
+        999.0 * sale.ExchangeRate
+    )
+    assert tax_report[2023].trade_cost == pytest.approx(
+        800.0 * purchase.ExchangeRate
+    )
+    assert tax_reporter.open_positions_["Quantity"].tolist() == [1.0]
+
+
+def test_uncovered_short_sale():
+    with pytest.warns(UserWarning, match="TSLA"):
+        ShortTaxReporter(SHORT.iloc[:1]).generate()
+    with pytest.raises(ValueError, match="TSLA"):
+        FrameTaxReporter(SHORT).generate()
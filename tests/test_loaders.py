@@ -0,0 +1,46 @@
+import pandas as pd
+import pytest
+from conftest import DATA
+
+from polish_pit_calculator.coinbase import CoinbaseTaxReporter
+from polish_pit_calculator.ib import IBTradeCashTaxReporter
+from polish_pit_calculator.ledger import LEDGER_COLUMNS
+from polish_pit_calculator.revolut import RevolutInterestTaxReporter
+from polish_pit_calculator.schwab import SchwabEmployeeSponsoredTaxReporter
+
+LOADERS = [
+    (SchwabEmployeeSponsoredTaxReporter, ["schwab.csv"]),
+    (SchwabEmployeeSponsoredTaxReporter, ["schwab.json"]),
+    (IBTradeCashTaxReporter, ["ib.csv"]),
+    (CoinbaseTaxReporter, ["coinbase.csv"]),
+    (RevolutInterestTaxReporter, ["revolut.csv"]),
+]
+
+
+@pytest.mark.parametrize("tax_reporter_cls, names", LOADERS)
+@pytest.mark.parametrize("fixed_point", [False, True])
+def test_low_memory_matches_default(tax_reporter_cls, names, fixed_point):
+    files = [DATA / x for x in names]
+    default = tax_reporter_cls(*files, fixed_point=fixed_point)
+    low_memory = tax_reporter_cls(
+        *files, fixed_point=fixed_point, low_memory=True
+    )
+    low_memory.chunk_size = 2
+    expected = default.generate()
+    assert expected.items()
+    assert low_memory.generate().items() == expected.items()
+    assert low_memory.duplicate_rows_ == default.duplicate_rows_
+    strings = {k: "string" for k, v in LEDGER_COLUMNS.items() if v == "string"}
+    pd.testing.assert_frame_equal(
+        low_memory.ledger_.astype(strings), default.ledger_.astype(strings)
+    )
+
+
+@pytest.mark.parametrize("low_memory", [False, True])
+def test_ib_thousands_separator(low_memory):
+    tax_reporter = IBTradeCashTaxReporter(
+        DATA / "ib.csv", low_memory=low_memory
+    )
+    tax_reporter.generate()
+    trades = tax_reporter.transactions_["Trades"]
+    assert trades["Quantity"].tolist() == [1200.0, -200.0]
@@ -0,0 +1,95 @@
+import base64
+import json
+import threading
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+from conftest import DATA
+
+from polish_pit_calculator.server import ReportService, make_server
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(**kwargs):
+        service = ReportService(**kwargs)
+        server = make_server("127.0.0.1", 0, service)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append((server, service))
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server, service in servers:
+        server.shutdown()
+        server.server_close()
+        service.shutdown()
+
+
+def request(url, body=None):
+    data = None if body is None else json.dumps(body).encode()
+    try:
+        with urlopen(Request(url, data=data), timeout=30) as response:
+            return response.status, json.load(response)
+    except HTTPError as e:
+        return e.code, json.load(e)
+
+
+def report_body(*names, **kwargs):
+    files = [
+        {"content": base64.b64encode((DATA / x).read_bytes()).decode()}
+        for x in names
+    ]
+    return {"reporter": "ib", "files": files, **kwargs}
+
+
+def test_reports_are_cached(serve):
+    url = serve()
+    status, payload = request(f"{url}/reports", report_body("ib.csv"))
+    assert status == 200
+    assert payload["2023"]["trade_revenue"] > 0
+    assert request(f"{url}/reports", report_body("ib.csv")) == (200, payload)
+    status, stats = request(f"{url}/metrics")
+    assert status == 200
+    assert stats["cache"] == {"size": 1, "hits": 1, "misses": 1}
+    assert stats["endpoints"]["POST /reports"]["statuses"] == {"200": 2}
+
+
+def test_options_are_part_of_the_cache_key(serve):
+    url = serve()
+    request(f"{url}/reports", report_body("ib.csv"))
+    request(f"{url}/reports", report_body("ib.csv", fixed_point=True))
+    _, stats = request(f"{url}/metrics")
+    assert stats["cache"]["misses"] == 2
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {"files": []},
+        {"reporter": "ib"},
+        {"reporter": "unknown", "files": [{"content": ""}]},
+        {"reporter": "ib", "files": []},
+        {"reporter": "ib", "files": [{"content": "!!"}]},
+        report_body("ib.csv", fixed_point="false"),
+        report_body("ib.csv", low_memory=1),
+    ],
+)
+def test_invalid_requests(serve, body):
+    status, payload = request(f"{serve()}/reports", body)
+    assert status == 400
+    assert "error" in payload
+
+
+def test_unknown_paths(serve):
+    url = serve()
+    assert request(f"{url}/unknown")[0] == 404
+    assert request(f"{url}/unknown", report_body("ib.csv"))[0] == 404
+    assert request(f"{url}/health") == (200, {"status": "ok"})
+
+
+def test_busy_service(serve):
+    url = serve(max_pending=0)
+    assert request(f"{url}/reports", report_body("ib.csv"))[0] == 503
@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+from conftest import DATA
+
+from polish_pit_calculator.schwab import SchwabEmployeeSponsoredTaxReporter
+from polish_pit_calculator.simulator import simulate_sales
+
+OPEN_POSITIONS = pd.DataFrame(
+    {
+        "Symbol": ["XYZ", "ABC", "XYZ", "XYZ"],
+        "Type": ["ESPP", "ESPP", "RS", "ESPP"],
+        "Date": pd.to_datetime(
+            ["2023-06-01", "2021-01-01", "2020-01-01", "2022-01-01"]
+        ),
+        "Quantity": [10.0, 5.0, 10.0, 10.0],
+        "AmountPLN": [3000.0, 100.0, 500.0, 1000.0],
+    }
+)
+
+
+def test_sells_fifo_within_symbol_and_pool():
+    simulation = simulate_sales(
+        OPEN_POSITIONS,
+        quantities=[0, 5, 10, 15, 20],
+        prices=[50.0],
+        exchange_rates=[4.0],
+        symbol="XYZ",
+        pool="ESPP",
+    )
+    assert simulation["Cost"].tolist() == [0.0, 500.0, 1000.0, 2500.0, 4000.0]
+    assert simulation["Revenue"].tolist() == [
+        0.0,
+        1000.0,
+        2000.0,
+        3000.0,
+        4000.0,
+    ]
+    with pytest.raises(ValueError, match="Cannot sell more than 20"):
+        simulate_sales(
+            OPEN_POSITIONS, [21], [50.0], [4.0], symbol="XYZ", pool="ESPP"
+        )
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"symbol": "XYZ"}, {"pool": "ESPP"}])
+def test_rejects_several_groups(kwargs):
+    with pytest.raises(ValueError, match="several symbols or pools"):
+        simulate_sales(OPEN_POSITIONS, [1], [50.0], [4.0], **kwargs)
+
+
+def test_simulates_reporter_open_positions():
+    tax_reporter = SchwabEmployeeSponsoredTaxReporter(DATA / "schwab.csv")
+    tax_reporter.generate()
+    positions = tax_reporter.open_positions_
+    with pytest.raises(ValueError, match="several symbols or pools"):
+        simulate_sales(positions, [1], [100.0], [4.0])
+    rs = positions[positions["Type"] == "RS"]
+    simulation = simulate_sales(
+        positions,
+        quantities=[rs["Quantity"].sum()],
+        prices=[100.0],
+        exchange_rates=[4.0],
+        symbol="XYZ",
+        pool="RS",
+    )
+    assert simulation["Cost"].tolist() == pytest.approx(
+        [rs["AmountPLN"].sum()]
+    )
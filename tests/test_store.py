@@ -0,0 +1,104 @@
+import pandas as pd
+import pytest
+from conftest import DATA
+
+from polish_pit_calculator.coinbase import CoinbaseTaxReporter
+from polish_pit_calculator.ib import IBTradeCashTaxReporter
+from polish_pit_calculator.manual import ManualTaxReporter
+from polish_pit_calculator.revolut import RevolutInterestTaxReporter
+from polish_pit_calculator.schwab import SchwabEmployeeSponsoredTaxReporter
+from polish_pit_calculator.store import TaxStore
+
+
+@pytest.fixture
+def tax_store(tmp_path):
+    tax_store = TaxStore(tmp_path / "store.sqlite")
+    yield tax_store
+    tax_store.close()
+
+
+def save(tax_store, tax_reporter_cls, *names, **kwargs):
+    files = [DATA / x for x in names]
+    tax_reporter = tax_reporter_cls(*files, **kwargs)
+    file_hash = TaxStore.report_hash(tax_reporter, *files)
+    tax_report = tax_reporter.generate()
+    tax_store.save("default", file_hash, tax_reporter, tax_report, names)
+    return file_hash
+
+
+@pytest.mark.parametrize(
+    "tax_reporter_cls, name, year, symbol",
+    [
+        (SchwabEmployeeSponsoredTaxReporter, "schwab.csv", 2023, "XYZ"),
+        (IBTradeCashTaxReporter, "ib.csv", 2023, "AAPL"),
+        (CoinbaseTaxReporter, "coinbase.csv", 2023, "BTC"),
+        (RevolutInterestTaxReporter, "revolut.csv", 2023, None),
+    ],
+)
+@pytest.mark.parametrize("low_memory", [False, True])
+def test_transactions_by_year_and_symbol(
+    tax_store, tax_reporter_cls, name, year, symbol, low_memory
+):
+    save(tax_store, tax_reporter_cls, name, low_memory=low_memory)
+    transactions = tax_store.load_transactions("default", year=year)
+    assert not transactions.empty
+    assert transactions["year"].notna().all()
+    if symbol is not None:
+        assert not tax_store.load_transactions(
+            "default", year=year, symbol=symbol
+        ).empty
+
+
+def test_report_hash_covers_reporter_and_options(tax_store):
+    file_hash = save(tax_store, IBTradeCashTaxReporter, "ib.csv")
+    files = [DATA / "ib.csv"]
+    assert tax_store.load_tax_report("default", file_hash) is not None
+    for tax_reporter in [
+        IBTradeCashTaxReporter(*files, fixed_point=True),
+        IBTradeCashTaxReporter(*files, low_memory=True),
+        SchwabEmployeeSponsoredTaxReporter(*files),
+    ]:
+        other = TaxStore.report_hash(tax_reporter, *files)
+        assert other != file_hash
+        assert tax_store.load_tax_report("default", other) is None
+    assert (
+        TaxStore.report_hash(IBTradeCashTaxReporter(*files), *files)
+        == file_hash
+    )
+
+
+def save_manual(tax_store, year, **tax_data):
+    tax_reporter = ManualTaxReporter({"year": year, "tax_data": tax_data})
+    file_hash = TaxStore.report_hash(tax_reporter)
+    tax_report = tax_reporter.generate()
+    tax_store.save("default", file_hash, tax_reporter, tax_report, [])
+    return file_hash
+
+
+def test_overlapping_saves_are_not_double_counted(tax_store):
+    first = save(tax_store, IBTradeCashTaxReporter, "ib.csv")
+    save(tax_store, IBTradeCashTaxReporter, "ib.csv", fixed_point=True)
+    latest = save(
+        tax_store, IBTradeCashTaxReporter, "ib.csv", "ib_withholding_only.csv"
+    )
+    expected = tax_store.load_tax_report("default", latest)
+    pd.testing.assert_frame_equal(
+        tax_store.load_tax_report("default").to_dataframe(),
+        expected.to_dataframe(),
+    )
+    both = tax_store.load_tax_report("default", first, latest)
+    assert both[2023].trade_revenue == pytest.approx(
+        2 * expected[2023].trade_revenue
+    )
+
+
+def test_manual_entries_are_saved(tax_store):
+    save(tax_store, IBTradeCashTaxReporter, "ib.csv")
+    trade_revenue = tax_store.load_tax_report("default")[2023].trade_revenue
+    save_manual(tax_store, 2023, employment_revenue=100.0)
+    save_manual(tax_store, 2023, employment_revenue=250.0)
+    save_manual(tax_store, 2024, employment_revenue=50.0)
+    tax_report = tax_store.load_tax_report("default")
+    assert tax_report[2023].trade_revenue == trade_revenue
+    assert tax_report[2023].employment_revenue == 250.0
+    assert tax_report[2024].employment_revenue == 50.0
@@ -0,0 +1,61 @@
+from datetime import timedelta
+from io import BytesIO
+
+import pytest
+
+from polish_pit_calculator.store import TaxStore
+from polish_pit_calculator.uploads import UploadStore
+
+
+def upload(name, content):
+    f = BytesIO(content)
+    f.name = name
+    return f
+
+
+@pytest.fixture
+def upload_store(tmp_path):
+    return UploadStore(tmp_path, max_session_bytes=100, max_total_bytes=150)
+
+
+def test_files_are_content_addressed(upload_store):
+    [a] = upload_store.put("s1", upload("a.csv", b"x" * 10))
+    [c] = upload_store.put("s1", upload("c.csv", b"x" * 10))
+    assert a.name == "a.csv" and c.name == "c.csv"
+    assert a.path == c.path and a.path.read_bytes() == b"x" * 10
+    assert TaxStore.hash_files(a) == TaxStore.hash_files(upload("", b"x" * 10))
+    upload_store.release("s1", a)
+    assert c.path.exists()
+    upload_store.release("s1", c)
+    assert not c.path.exists()
+
+
+def test_session_cap(upload_store):
+    upload_store.put("s1", upload("a.csv", b"x" * 60))
+    with pytest.raises(ValueError, match="limit"):
+        upload_store.put("s1", upload("b.csv", b"y" * 60))
+    assert upload_store.touch("s1")
+    assert len(list(upload_store.root.iterdir())) == 1
+
+
+def test_lru_eviction_is_reported(upload_store):
+    [a] = upload_store.put("s1", upload("a.csv", b"x" * 60))
+    [b] = upload_store.put("s2", upload("b.csv", b"y" * 60))
+    upload_store.touch("s1", a)
+    [c] = upload_store.put("s3", upload("c.csv", b"z" * 60))
+    assert not b.path.exists()
+    assert not upload_store.touch("s2", b)
+    assert upload_store.touch("s1", a) and upload_store.touch("s3", c)
+
+
+def test_pinned_files_outlive_eviction(tmp_path):
+    upload_store = UploadStore(tmp_path, ttl=timedelta(0))
+    [a] = upload_store.put("s1", upload("a.csv", b"x" * 10))
+    upload_store.pin(a)
+    upload_store.touch("s2")
+    assert not upload_store.touch("s1", a)
+    assert a.path.exists()
+    upload_store.release("s1")
+    assert a.path.exists()
+    upload_store.unpin(a)
+    assert not a.path.exists()
@@ -0,0 +1,162 @@
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import DATA
+
+from polish_pit_calculator.utils import (
+    ExchangeRateTable,
+    find_duplicates,
+    fingerprint_rows,
+    get_exchange_rates,
+    iter_json_array,
+    parse_exchange_rates_archive,
+)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1 << 16])
+def test_iter_json_array(chunk_size):
+    content = (DATA / "schwab.json").read_text()
+    items = list(
+        iter_json_array(StringIO(content), "Transactions", chunk_size)
+    )
+    assert items == json.loads(content)["Transactions"]
+    content = '{"Transactions": [1, 23, 456, -7.5e-3, "8,9", [10], true]}'
+    items = list(
+        iter_json_array(StringIO(content), "Transactions", chunk_size)
+    )
+    assert items == json.loads(content)["Transactions"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 1 << 16])
+def test_iter_json_array_truncated(chunk_size):
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array(StringIO('{"K": [1, 23'), "K", chunk_size))
+
+
+def test_fingerprint_rows():
+    df = pd.DataFrame(
+        {
+            "Symbol": ["XYZ", " XYZ ", "XYZ", "ABC", None],
+            "Amount": [1.5, 1.5, 2.5, 1.5, 1.5],
+        }
+    )
+    fingerprints = fingerprint_rows(df)
+    assert fingerprints[0] == fingerprints[1]
+    assert len(set(fingerprints[[0, 2, 3, 4]])) == 4
+    amounts = fingerprint_rows(df, ["Amount"])
+    assert (amounts[[0, 1, 3, 4]] == amounts[0]).all()
+    assert amounts[2] != amounts[0]
+
+
+def test_find_duplicates():
+    fingerprints = np.array([1, 1, 2, 1, 2, 1, 1, 3], dtype=np.uint64)
+    sources = np.array([0, 0, 0, 1, 1, 1, 1, 1])
+    assert find_duplicates(fingerprints, sources).tolist() == [
+        False,
+        False,
+        False,
+        True,
+        True,
+        True,
+        False,
+        False,
+    ]
+
+
+def test_parse_exchange_rates_archive():
+    df = parse_exchange_rates_archive((DATA / "nbp_archive.csv").read_bytes())
+    assert df.columns.tolist() == ["_1USD", "_1EUR", "_100JPY"]
+    assert df.index.tolist() == [
+        date(2023, 1, 2),
+        date(2023, 1, 3),
+        date(2023, 1, 4),
+        date(2023, 1, 5),
+        date(2023, 1, 9),
+    ]
+    assert df.loc[date(2023, 1, 3)].tolist() == [4.4225, 4.6982, 3.3677]
+    assert (df.dtypes == "float64").all()
+
+
+def test_exchange_rate_of_previous_business_day():
+    df = parse_exchange_rates_archive((DATA / "nbp_archive.csv").read_bytes())
+    exchange_rates = {"USD": df["_1USD"].to_dict()}
+    dates = pd.to_datetime(
+        ["2023-01-03 15:30", "2023-01-06", "2023-01-08", "2023-01-09"],
+        format="ISO8601",
+    )
+    rates, rate_dates = get_exchange_rates(["USD"] * 4, dates, exchange_rates)
+    assert rates.tolist() == [4.3960, 4.4154, 4.4154, 4.4154]
+    assert pd.DatetimeIndex(rate_dates).date.tolist() == [
+        date(2023, 1, 2),
+        date(2023, 1, 5),
+        date(2023, 1, 5),
+        date(2023, 1, 5),
+    ]
+    with pytest.raises(ValueError, match="No USD exchange rate"):
+        get_exchange_rates(
+            ["USD"], pd.to_datetime(["2023-01-02"]), exchange_rates
+        )
+
+
+class FakeArchives:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def __call__(self, year):
+        with self.lock:
+            self.calls[year] += 1
+            version = self.calls[year]
+        time.sleep(self.delay)
+        return pd.DataFrame(
+            {"_1USD": [4.0 + version], "_1EUR": [4.5 + version]},
+            index=[date(year, 1, 2)],
+        )
+
+
+def test_exchange_rate_table_fetches_each_year_once(monkeypatch):
+    fake = FakeArchives(delay=0.1)
+    monkeypatch.setattr(
+        "polish_pit_calculator.utils._fetch_exchange_rates_archive", fake
+    )
+    table = ExchangeRateTable()
+    year = datetime.now().year
+    with ThreadPoolExecutor(8) as executor:
+        results = list(
+            executor.map(lambda _: table.exchange_rates(year), range(8))
+        )
+    assert fake.calls == {year - 1: 1, year: 1}
+    assert all(x is results[0] for x in results)
+    assert results[0]["USD"] == {
+        date(year - 1, 1, 2): 5.0,
+        date(year, 1, 2): 5.0,
+    }
+    assert table.exchange_rates(year) is results[0]
+    assert fake.calls == {year - 1: 1, year: 1}
+
+
+def test_exchange_rate_table_refreshes_current_year(monkeypatch):
+    fake = FakeArchives()
+    monkeypatch.setattr(
+        "polish_pit_calculator.utils._fetch_exchange_rates_archive", fake
+    )
+    table = ExchangeRateTable(refresh_interval=timedelta(0))
+    year = datetime.now().year
+    stale = table.exchange_rates(year)
+    assert stale["USD"][date(year, 1, 2)] == 5.0
+    deadline = time.monotonic() + 5
+    while table.exchange_rates(year)["USD"][date(year, 1, 2)] == 5.0:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert fake.calls[year] >= 2
+    assert fake.calls[year - 1] == 1
+    assert stale["USD"][date(year, 1, 2)] == 5.0